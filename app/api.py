@@ -1,112 +1,356 @@
-from fastapi import Header, status, APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import Query, Request, Response, APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime
 from fastapi.security import OAuth2PasswordRequestForm
-from jose import jwt, JWTError
-import ast
-from sqlalchemy.sql import text
+import json
+import logging
+import time
+from urllib.parse import quote
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from typing import List, Optional
 
-from app.auth import SECRET_KEY, ALGORITHM, verify_password, create_access_token, get_password_hash
-from app.db import get_db, SessionLocal
-from app.crud import mark_message_as_read, get_messages, create_chat, add_chat_member, get_chat_members, create_message, create_user, get_user_by_email
-from app.websocket import manager
-from app.schemas import MessageCreate, UserCreate, ChatCreate
-from app.models import Message, User, Chat
+from app.auth import create_access_token, password_hasher
+from app.db import get_db, SessionLocal, read_router
+from app.crud import mark_message_as_read, get_messages, encode_cursor, create_chat, add_chat_member, get_chat_members, create_user, get_user_by_email, is_chat_member, advance_read_watermark, update_user_password, stream_messages_after, get_user_chats, add_chat_members_bulk, search_messages, encode_search_cursor, create_attachment, count_own_attachments, get_attachment_for_user, get_message_attachments
+from app.websocket import Connection, manager
+from app.config import WS_RESUME_BATCH_SIZE, WS_RESUME_MAX_MESSAGES, MESSAGE_ATTACHMENTS_MAX, ATTACHMENTS_ACCEL_REDIRECT
+from app.dependencies import CurrentUser, get_current_user, get_current_user_ws, get_read_db, last_write_time, mark_write
+from app.ingest import ingestor
+from app.log import log_event
+from app.metrics import render_metrics, ws_receive_to_persist_seconds, ws_receive_to_deliver_seconds
+from app.schemas import MessageResponse, UserCreate, ChatCreate, ChatMembersBulk
+from app.responses import ORJSONResponse
+from app.export import EXPORT_FORMATS, export_chat
+from app.attachments import AttachmentTooLarge, attachment_store
+from app.protocol import ERROR, READ, TYPING, parse_frame, typing_frame
 
 router = APIRouter()
 
+async def check_attachments(user_id: int, attachment_ids: tuple) -> Optional[str]:
+    """Текст ошибки, если к сообщению нельзя прикрепить эти вложения"""
+    if len(attachment_ids) > MESSAGE_ATTACHMENTS_MAX:
+        return f"⚠️ Не больше {MESSAGE_ATTACHMENTS_MAX} вложений в сообщении"
+    async with SessionLocal() as db:
+        if await count_own_attachments(db, attachment_ids, user_id) != len(attachment_ids):
+            return "⚠️ Вложение не найдено"
+    return None
+
+async def notify_fully_read(fully_read: list):
+    """Одно уведомление каждому отправителю: до какого сообщения его сообщения прочитаны всеми"""
+    last_read_by_sender = {}
+    for message in fully_read:
+        last_read_by_sender[message["sender_id"]] = max(message["id"], last_read_by_sender.get(message["sender_id"], 0))
+    for sender_id, message_id in last_read_by_sender.items():
+        await manager.send_message(sender_id, f"✅ Ваши сообщения до {message_id} прочитаны!")
+
+async def replay_missed(connection: Connection, chat_id: int, last_seen: int):
+    """Догружаем сообщения после last_seen пачками, затем переключаем соединение на живую доставку.
+
+    Соединение уже в комнате чата, поэтому живые сообщения, пришедшие во время догрузки, отложены
+    и после неё отправляются без тех, что уже попали в догрузку.
+    """
+    last_id, sent, batch_ids = last_seen, 0, []
+    try:
+        async with SessionLocal() as db:
+            async for rows in stream_messages_after(db, chat_id, last_seen, WS_RESUME_BATCH_SIZE, WS_RESUME_MAX_MESSAGES):
+                batch_ids = [row.id for row in rows]
+                attachments = await get_message_attachments(db, batch_ids)
+                frame = json.dumps({"type": "backlog", "messages": [
+                    {"id": row.id, "sender_id": row.sender_id, "text": row.text, "timestamp": row.timestamp.isoformat(),
+                     "attachments": attachments.get(row.id, [])}
+                    for row in rows
+                ]}, ensure_ascii=False)
+                if not await manager.send_replay(connection, frame, batch_ids):
+                    return  # Клиент отключился во время догрузки
+                last_id, sent = batch_ids[-1], sent + len(rows)
+
+        end = {"type": "backlog_end", "last_message_id": last_id, "truncated": sent >= WS_RESUME_MAX_MESSAGES}
+        await manager.send_replay(connection, json.dumps(end), [])
+        log_event(logging.INFO, "ws.replay", user_id=connection.user_id, chat_id=chat_id, messages=sent)
+    finally:
+        manager.finish_replay(connection, batch_ids)
+
 ### 🚀 **WebSocket подключение**
 @router.websocket("/ws/{user_id}/{chat_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int, chat_id: int):
-    """Подключение пользователя через WebSocket и обработка сообщений в реальном времени."""
-    print(f"👤 Пользователь {user_id} подключается к чату {chat_id}")
-    
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_id: int,
+    chat_id: int,
+    last_seen: int = Query(None, ge=0),
+    current_user: CurrentUser = Depends(get_current_user_ws)
+):
+    """Подключение пользователя через WebSocket и обработка сообщений в реальном времени.
+
+    last_seen — id последнего полученного сообщения: пропущенное после него придёт кадрами
+    {"type": "backlog", "messages": [...]}, затем {"type": "backlog_end", ...} и живые сообщения.
+    Кадры {"type": "typing"} и {"type": "presence"} эфемерные: рассылаются в памяти воркера, в БД не пишутся.
+    """
+    log_event(logging.INFO, "ws.connect", user_id=user_id, chat_id=chat_id)
+
+    if current_user.id != user_id:
+        await websocket.close(code=1008)  # Токен принадлежит другому пользователю
+        return
+
     async with SessionLocal() as db:
-        members = await get_chat_members(db, chat_id)
-        if not any(member["id"] == user_id for member in members["members"]):
+        if not await is_chat_member(db, chat_id, user_id):
             await websocket.close(code=1008)  # Код 1008 - policy violation
-            print(f"❌ Пользователь {user_id} НЕ состоит в чате {chat_id}. Закрываем WebSocket.")
+            log_event(logging.WARNING, "ws.rejected", user_id=user_id, chat_id=chat_id, reason="not_a_member")
             return
 
-    await manager.connect(websocket, user_id)
+    connection = await manager.connect(websocket, user_id, chat_id, replay=last_seen is not None)
+    manager.announce_presence(connection, online=True)
 
     try:
+        if last_seen is not None:
+            await replay_missed(connection, chat_id, last_seen)
+
         while True:
             data = await websocket.receive_text()
-            print(f"📩 Получено сообщение от {user_id}: {data}")
+            received_at = time.perf_counter()
+            log_event(logging.DEBUG, "ws.message", user_id=user_id, chat_id=chat_id, size=len(data))
+            frame = parse_frame(data)
 
-            async with SessionLocal() as db:
-                new_message = await create_message(db, chat_id, user_id, data)
+            if frame["type"] == ERROR:
+                manager.send_to_connection(connection, frame["error"])
+                continue
 
-                if isinstance(new_message, dict) and "error" in new_message:
-                    await manager.send_message(user_id, new_message["error"])
-                    continue  # Если сообщение дубликат - пропускаем отправку
+            if frame["type"] == TYPING:
+                # Эфемерное событие: без БД и брокера, не чаще раза в WS_EPHEMERAL_INTERVAL_MS
+                manager.publish_ephemeral(chat_id, user_id, TYPING, typing_frame(chat_id, user_id, frame["typing"]))
+                continue
 
-                members = await get_chat_members(db, chat_id)
-                for member in members["members"]:
-                    if member["id"] != user_id:
-                        await manager.send_message(member["id"], f"📩 Новое сообщение от {user_id}: {data}")
+            if frame["type"] == READ:
+                async with SessionLocal() as db:
+                    result = await advance_read_watermark(db, chat_id, user_id, frame["up_to"])
+                if "error" in result:
+                    manager.send_to_connection(connection, result["error"])
+                else:
+                    await notify_fully_read(result["fully_read"])
+                continue
 
-                await manager.send_message(user_id, f"✅ Сообщение '{data}' отправлено!")
+            data, attachment_ids = frame["text"], frame["attachments"]
+            if attachment_ids:
+                error = await check_attachments(user_id, attachment_ids)
+                if error:
+                    manager.send_to_connection(connection, error)
+                    continue
+
+            # Сообщение пишется в БД пачкой вместе с сообщениями других соединений
+            try:
+                new_message = await ingestor.submit(chat_id, user_id, data, frame["client_id"], attachment_ids)
+            except Exception as e:
+                # Ошибка записи пачки — сообщаем отправителю, соединение остаётся открытым
+                log_event(logging.ERROR, "ws.persist_failed", user_id=user_id, chat_id=chat_id, error=repr(e))
+                manager.send_to_connection(connection, "❌ Не удалось сохранить сообщение, попробуйте ещё раз")
+                continue
+            ws_receive_to_persist_seconds.observe(time.perf_counter() - received_at)
+
+            if isinstance(new_message, dict) and "error" in new_message:
+                manager.send_to_connection(connection, new_message["error"])
+                continue  # Если сообщение дубликат - пропускаем отправку
+
+            # Рассылка только тем, кто онлайн в этом чате, без запроса участников из БД
+            text_frame = f"📩 Новое сообщение от {user_id}: {data}"
+            if attachment_ids:
+                text_frame += f" 📎 {','.join(map(str, attachment_ids))}"  # Файлы — GET /attachments/{id}
+            try:
+                await manager.broadcast(chat_id, text_frame, exclude_user=user_id, message_id=new_message.id)
+            except Exception as e:
+                # Сообщение уже сохранено: получатели увидят его в /history или при переподключении
+                log_event(logging.ERROR, "ws.broadcast_failed", user_id=user_id, chat_id=chat_id, error=repr(e))
+
+            manager.send_to_connection(connection, f"✅ Сообщение '{data}' отправлено!")
+            ws_receive_to_deliver_seconds.observe(time.perf_counter() - received_at)
 
     except WebSocketDisconnect:
-        print(f"❌ Пользователь {user_id} отключился")
+        log_event(logging.INFO, "ws.disconnect", user_id=user_id, chat_id=chat_id)
+    finally:
         manager.disconnect(user_id, websocket)
+        manager.end_typing(connection)
+        manager.announce_presence(connection, online=False)
 
 ### 📜 **История сообщений**
-@router.get("/history/{chat_id}")
-async def get_chat_history(chat_id: int, db: AsyncSession = Depends(get_db)):
-    return await get_messages(db, chat_id)
+# Маршрут сам отдаёт ORJSONResponse, поэтому схема ответа — только для документации
+@router.get("/history/{chat_id}", response_class=ORJSONResponse,
+            responses={200: {"model": List[MessageResponse], "description": "Страница истории"}})
+async def get_chat_history(
+    chat_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    before: str = None,
+    after: str = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Страница истории. Курсор следующей страницы — в заголовке X-Next-Cursor."""
+    if before and after:
+        raise HTTPException(status_code=422, detail="Укажите только один курсор: before или after")
+    try:
+        messages = await get_messages(db, chat_id, limit, before=before, after=after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {}
+    if messages:
+        # Для before листаем дальше в прошлое, иначе — вперёд
+        newest, oldest = encode_cursor(messages[-1]), encode_cursor(messages[0])
+        next_cursor, prev_cursor = (oldest, newest) if before else (newest, oldest)
+        headers["X-Prev-Cursor"] = prev_cursor
+        if len(messages) == limit:
+            headers["X-Next-Cursor"] = next_cursor
+    # Строки уже в форме MessageResponse: сразу в orjson, без валидации и jsonable_encoder
+    attachments = await get_message_attachments(db, [row.id for row in messages])
+    return ORJSONResponse(
+        [{**row._asdict(), "attachments": attachments.get(row.id, [])} for row in messages], headers=headers
+    )
+
+### 🔎 **Поиск по сообщениям чата**
+@router.get("/chats/{chat_id}/search")
+async def search_chat(
+    chat_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    after: str = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Ранжированный поиск по сообщениям чата. Курсор следующей страницы — в заголовке X-Next-Cursor."""
+    if not await is_chat_member(db, chat_id, current_user.id):
+        raise HTTPException(status_code=403, detail="Пользователь не состоит в чате")
+    try:
+        results = await search_messages(db, chat_id, q, limit, after=after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {"X-Next-Cursor": encode_search_cursor(results[-1])} if len(results) == limit else {}
+    return ORJSONResponse(results, headers=headers)
+
+### 📦 **Экспорт истории чата**
+@router.get("/chats/{chat_id}/export")
+async def export_chat_history(
+    chat_id: int,
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Вся история чата потоком NDJSON или CSV (опционально в gzip), без загрузки в память"""
+    if not await is_chat_member(db, chat_id, current_user.id):
+        raise HTTPException(status_code=403, detail="Пользователь не состоит в чате")
+
+    # Отдача идёт уже после выхода из зависимостей, поэтому у потока своя сессия — по возможности с реплики
+    session_factory = await read_router.session_factory(last_write_time(request))
+    filename = f"chat-{chat_id}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        export_chat(chat_id, format, compress=gzip, session_factory=session_factory),
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+### 📎 **Загрузка вложения**
+@router.post("/attachments")
+async def upload_attachment(
+    request: Request,
+    response: Response,
+    filename: str = Query(None, max_length=255),
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Тело запроса — сам файл (можно Transfer-Encoding: chunked), тип — из Content-Type.
+
+    Файл пишется на диск по мере получения; одинаковое содержимое хранится один раз.
+    Полученный attachment_id прикрепляется к сообщению: {"text": ..., "attachments": [id]}.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > attachment_store.max_bytes:
+        raise HTTPException(status_code=413, detail=f"Файл больше {attachment_store.max_bytes} байт")
+    await db.close()  # Соединение возвращается в пул на время загрузки
+
+    try:
+        sha256, size, created = await attachment_store.save(request.stream())
+    except AttachmentTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    content_type = request.headers.get("content-type") or "application/octet-stream"
+    attachment = await create_attachment(db, sha256, size, content_type[:255], filename, current_user.id)
+    mark_write(response)
+    log_event(logging.INFO, "attachment.upload", user_id=current_user.id, size=size, deduplicated=not created)
+    return {"attachment_id": attachment.id, "sha256": sha256, "size": size, "deduplicated": not created}
+
+### 📎 **Скачивание вложения**
+@router.get("/attachments/{attachment_id}")
+async def download_attachment(
+    attachment_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Файл вложения для его автора и участников чатов, куда оно отправлено. Поддерживает Range."""
+    attachment = await get_attachment_for_user(db, attachment_id, current_user.id)
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Вложение не найдено")
+
+    # Содержимое по хэшу не меняется: ETag — сам хэш, кэшировать можно сколько угодно
+    headers = {"ETag": f'"{attachment.sha256}"', "Cache-Control": "private, max-age=31536000, immutable"}
+    if ATTACHMENTS_ACCEL_REDIRECT:
+        # nginx сам отдаст файл через sendfile и обработает Range, воркер только проверил доступ
+        headers["X-Accel-Redirect"] = f"{ATTACHMENTS_ACCEL_REDIRECT}/{attachment_store.relative_path(attachment.sha256)}"
+        headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(attachment.filename or str(attachment.id))}"
+        return Response(media_type=attachment.content_type, headers=headers)
+    # FileResponse читает файл с диска блоками и сам разбирает Range
+    return FileResponse(
+        attachment_store.path(attachment.sha256),
+        media_type=attachment.content_type,
+        filename=attachment.filename or str(attachment.id),
+        headers=headers,
+    )
 
 ### ✅ **Отметка о прочтении сообщений**
 @router.put("/message/read/{message_id}")
 async def mark_message_read(
-    message_id: int, 
+    message_id: int,
+    response: Response,
     db: AsyncSession = Depends(get_db),
-    authorization: str = Header(None)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header is missing")
+    # Отмечаем сообщение прочитанным и сразу узнаём, прочитано ли оно всеми
+    result = await mark_message_as_read(db, message_id, current_user.id)
+    if "error" in result:
+        # Не участнику чата сообщение не видно: 404, как и для несуществующего
+        raise HTTPException(status_code=404, detail=result["error"])
+    mark_write(response)
 
-    try:
-        token = authorization.split(" ")[1]  # Убираем "Bearer"
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    if result["fully_read"]:
+        await manager.send_message(result["sender_id"], f"✅ Ваше сообщение {message_id} прочитано!")
 
-        # ✅ Теперь `sub` — это email пользователя
-        user_email = payload.get("sub")
-        if not user_email:
-            raise HTTPException(status_code=401, detail="Invalid token structure")
+    return {"message": result["message"]}
 
-    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-    # Отмечаем сообщение прочитанным
-    result = await mark_message_as_read(db, message_id, user_email)  
+### 📖 **Прочитано всё до сообщения**
+@router.put("/chats/{chat_id}/read")
+async def mark_chat_read(
+    chat_id: int,
+    up_to: int,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Сдвигаем водяной знак прочтения: одна запись вместо отметки каждого сообщения"""
+    result = await advance_read_watermark(db, chat_id, current_user.id, up_to)
+    if "error" in result:
+        raise HTTPException(status_code=403, detail=result["error"])
+    mark_write(response)
 
-    if "error" not in result:
-        async with SessionLocal() as db:
-            message = await db.get(Message, message_id)
-            
-            if message:
-                # 1️⃣ Проверяем, сколько людей должны прочитать (без отправителя)
-                total_members = await db.execute(
-                    text("SELECT COUNT(*) FROM chat_members WHERE chat_id = :chat_id AND user_id != :sender_id"),
-                    {"chat_id": message.chat_id, "sender_id": message.sender_id}
-                )
-                total_members = total_members.scalar()
-
-                # 2️⃣ Проверяем, сколько уже прочитали
-                read_count = await db.execute(
-                    text("SELECT COUNT(*) FROM message_readers WHERE message_id = :message_id"),
-                    {"message_id": message_id}
-                )
-                read_count = read_count.scalar()
-
-                # 3️⃣ Если это **последний пользователь**, отправляем уведомление
-                if read_count == total_members:
-                    await manager.send_message(message.sender_id, f"✅ Ваше сообщение {message_id} прочитано!")
+    await notify_fully_read(result["fully_read"])
+    return {"chat_id": chat_id, "last_read_message_id": result["last_read_message_id"]}
 
-    return result
+### 📥 **Список чатов пользователя**
+@router.get("/users/me/chats")
+async def get_my_chats(
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """Чаты пользователя с последним сообщением и числом непрочитанных — одним запросом"""
+    return ORJSONResponse(await get_user_chats(db, current_user.id, limit))
 
 ### 🔹 **Создание чата**
 @router.post("/chats")
@@ -116,12 +360,22 @@ async def create_new_chat(chat: ChatCreate, db: AsyncSession = Depends(get_db)):
 
 ### 👥 **Добавление пользователей в чат**
 @router.post("/chats/{chat_id}/members")
-async def add_user_to_chat(chat_id: int, user_id: int, db: AsyncSession = Depends(get_db)):
-    return await add_chat_member(db, chat_id, user_id)
+async def add_user_to_chat(chat_id: int, user_id: int, response: Response, db: AsyncSession = Depends(get_db)):
+    result = await add_chat_member(db, chat_id, user_id)
+    mark_write(response)
+    return result
+
+### 👥 **Массовое добавление пользователей в чат**
+@router.post("/chats/{chat_id}/members/bulk")
+async def add_users_to_chat(chat_id: int, body: ChatMembersBulk, response: Response, db: AsyncSession = Depends(get_db)):
+    """Добавляет список пользователей за один проход: {"added": ..., "skipped": ..., "missing": ...}"""
+    result = await add_chat_members_bulk(db, chat_id, body.user_ids)
+    mark_write(response)
+    return result
 
 ### 🔍 **Просмотр участников чата**
 @router.get("/chats/{chat_id}/members")
-async def get_chat_users(chat_id: int, db: AsyncSession = Depends(get_db)):
+async def get_chat_users(chat_id: int, db: AsyncSession = Depends(get_read_db)):
     return await get_chat_members(db, chat_id)
 
 # 🔐 **Регистрация пользователя**
@@ -131,16 +385,30 @@ async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    user.password = get_password_hash(user.password)
+    # bcrypt выполняется в пуле, не блокируя остальные соединения воркера
+    user.password = await password_hasher.hash(user.password)
     new_user = await create_user(db, user)
-    return {"message": "Пользователь успешно зарегистрирован!"}
+    return {"message": "Пользователь успешно зарегистрирован!", "user_id": new_user.id}
 
 # 🔑 **Получение токена (авторизация пользователя)**
 @router.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     user = await get_user_by_email(db, form_data.username)
-    if not user or not verify_password(form_data.password, user.password):
+    if not user:
         raise HTTPException(status_code=400, detail="Неправильная почта или пароль")
 
+    valid, new_hash = await password_hasher.verify_and_update(form_data.password, user.password)
+    if not valid:
+        raise HTTPException(status_code=400, detail="Неправильная почта или пароль")
+    if new_hash:
+        # Параметры bcrypt изменились — прозрачно перехэшируем пароль
+        await update_user_password(db, user, new_hash)
+
     token = create_access_token({"sub": user.email})
     return {"access_token": token, "token_type": "bearer"}
+
+### 📊 **Метрики**
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Метрики воркера в текстовом формате Prometheus"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import AsyncIterator, Tuple
+from app.config import ATTACHMENTS_DIR, ATTACHMENT_MAX_BYTES, ATTACHMENT_WRITE_BUFFER
+
+class AttachmentTooLarge(Exception):
+    pass
+
+class AttachmentStore:
+    """Файлы вложений на локальном диске, адресуемые по SHA-256 содержимого.
+
+    Загрузка пишется во временный файл по мере поступления тела запроса, хэш считается на лету.
+    Готовый файл переименовывается в <root>/ab/cd/<sha256>; если такой уже есть — временный удаляется.
+    Запись и хэширование идут в потоке, в event loop остаётся только буфер не больше write_buffer байт.
+    """
+
+    def __init__(self, root: str = ATTACHMENTS_DIR, max_bytes: int = ATTACHMENT_MAX_BYTES,
+                 write_buffer: int = ATTACHMENT_WRITE_BUFFER):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.write_buffer = write_buffer
+
+    @staticmethod
+    def relative_path(sha256: str) -> str:
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, self.relative_path(sha256))
+
+    async def save(self, chunks: AsyncIterator[bytes]) -> Tuple[str, int, bool]:
+        """Сохраняет поток байтов: (sha256, размер, True — если такого содержимого ещё не было)"""
+        file = await asyncio.to_thread(self._open_temp)
+        digest, size, buffer = hashlib.sha256(), 0, bytearray()
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise AttachmentTooLarge(f"Файл больше {self.max_bytes} байт")
+                buffer += chunk
+                if len(buffer) >= self.write_buffer:
+                    await asyncio.to_thread(self._write, file, digest, bytes(buffer))
+                    buffer.clear()
+            if not size:
+                raise ValueError("Пустой файл")
+            await asyncio.to_thread(self._write, file, digest, bytes(buffer))
+            await asyncio.to_thread(self._close, file)
+            sha256 = digest.hexdigest()
+            created = await asyncio.to_thread(self._commit, file.name, sha256)
+        except BaseException:
+            # Обрыв загрузки, пустой или слишком большой файл, отмена запроса — временный файл не нужен
+            await asyncio.to_thread(self._discard, file)
+            raise
+        return sha256, size, created
+
+    def _open_temp(self):
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False)
+
+    @staticmethod
+    def _write(file, digest, data: bytes):
+        digest.update(data)  # hashlib отпускает GIL на больших блоках
+        file.write(data)
+
+    @staticmethod
+    def _close(file):
+        file.flush()
+        os.fsync(file.fileno())  # Под именем-хэшем не должен оказаться недописанный файл
+        file.close()
+
+    def _commit(self, tmp_path: str, sha256: str) -> bool:
+        target = self.path(sha256)
+        if os.path.exists(target):
+            os.unlink(tmp_path)
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)  # Атомарно: параллельная загрузка того же файла просто перезапишет его тем же
+        return True
+
+    @staticmethod
+    def _discard(file):
+        file.close()
+        try:
+            os.unlink(file.name)
+        except FileNotFoundError:
+            pass
+
+attachment_store = AttachmentStore()
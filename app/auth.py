@@ -1,13 +1,19 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from jose import jwt
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
 import json
+import time
+from app.config import BCRYPT_ROUNDS, PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS
+from app.metrics import Gauge, password_hash_seconds, password_hash_wait_seconds
 
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# При смене BCRYPT_ROUNDS старые хэши помечаются как требующие обновления
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -15,6 +21,75 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def verify_and_update_password(plain_password, hashed_password):
+    """Проверка пароля; вторым элементом — новый хэш, если у старого устарели параметры"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+class PasswordHasher:
+    """Выполняет bcrypt в пуле потоков или процессов, чтобы не блокировать event loop.
+
+    Одновременно в пул отправляется не больше max_concurrency задач, остальные ждут в очереди.
+    """
+
+    def __init__(self, executor: str = PASSWORD_HASH_EXECUTOR, workers: int = PASSWORD_HASH_WORKERS, max_concurrency: int = None):
+        if executor == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        elif executor == "thread":
+            # bcrypt отпускает GIL, поэтому потоков достаточно
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        else:
+            raise ValueError(f"Неизвестный PASSWORD_HASH_EXECUTOR: {executor}")
+        self._semaphore = asyncio.Semaphore(max_concurrency or workers)
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.total_wait_seconds = 0.0
+        self.total_hash_seconds = 0.0
+
+    async def _run(self, operation: str, func, *args):
+        queued_at = time.perf_counter()
+        self.queued += 1
+        async with self._semaphore:
+            self.queued -= 1
+            started_at = time.perf_counter()
+            self.total_wait_seconds += started_at - queued_at
+            password_hash_wait_seconds.observe(started_at - queued_at, operation)
+            self.in_flight += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+            finally:
+                elapsed = time.perf_counter() - started_at
+                self.in_flight -= 1
+                self.completed += 1
+                self.total_hash_seconds += elapsed
+                password_hash_seconds.observe(elapsed, operation)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str):
+        return await self._run("verify", verify_and_update_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "total_wait_seconds": self.total_wait_seconds,
+            "total_hash_seconds": self.total_hash_seconds,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+password_hasher = PasswordHasher()
+
+Gauge("password_hash_queued", "Задачи bcrypt, ждущие места в пуле", lambda: password_hasher.queued)
+Gauge("password_hash_in_flight", "Задачи bcrypt, выполняющиеся в пуле", lambda: password_hasher.in_flight)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     
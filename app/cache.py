@@ -0,0 +1,62 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.config import MEMBERSHIP_CACHE_SIZE, MEMBERSHIP_CACHE_TTL
+from app.pubsub import Broker, broker
+from app.metrics import Gauge
+
+# Канал брокера для инвалидации кэша участников на всех воркерах
+MEMBERSHIP_CHANNEL = "membership_invalidate"
+
+class MembershipCache:
+    """TTL/LRU кэш участников чатов по chat_id с инвалидацией через брокер"""
+
+    def __init__(self, broker: Broker, max_size: int = MEMBERSHIP_CACHE_SIZE, ttl: float = MEMBERSHIP_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()  # chat_id -> (expires_at, members)
+        # Увеличивается при каждой инвалидации, чтобы не записать в кэш устаревший результат запроса
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.broker = broker
+        self.broker.subscribe(MEMBERSHIP_CHANNEL, self._on_invalidate)
+
+    def get(self, chat_id: int) -> Optional[dict]:
+        entry = self._entries.get(chat_id)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(chat_id)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, chat_id: int, members: dict, generation: int):
+        """Сохраняем участников, если с момента начала запроса не было инвалидаций"""
+        if generation != self.generation:
+            return
+        self._entries[chat_id] = (time.monotonic() + self.ttl, members)
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate_local(self, chat_id: int):
+        self.generation += 1
+        self._entries.pop(chat_id, None)
+
+    async def invalidate(self, chat_id: int):
+        """Сбрасываем запись на этом воркере и рассылаем инвалидацию остальным"""
+        self.invalidate_local(chat_id)
+        await self.broker.publish(MEMBERSHIP_CHANNEL, {"chat_id": chat_id})
+
+    async def _on_invalidate(self, payload: dict):
+        self.invalidate_local(payload["chat_id"])
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+membership_cache = MembershipCache(broker)
+
+Gauge("membership_cache_size", "Чаты в кэше участников", lambda: len(membership_cache._entries))
+Gauge("membership_cache_hits_total", "Попадания в кэш участников", lambda: membership_cache.hits, kind="counter")
+Gauge("membership_cache_misses_total", "Промахи кэша участников", lambda: membership_cache.misses, kind="counter")
@@ -0,0 +1,114 @@
+import os
+from typing import Union
+from dotenv import load_dotenv
+
+load_dotenv()
+
+def env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+def env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# 🗄️ База данных
+DATABASE_URL: str = os.getenv("DATABASE_URL")
+# Логирование SQL: "false", "true" (запросы) или "debug" (запросы и результаты)
+DB_ECHO: Union[bool, str] = {"true": True, "debug": "debug"}.get(os.getenv("DB_ECHO", "false").lower(), False)
+# Пул соединений
+DB_POOL_SIZE: int = env_int("DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW: int = env_int("DB_MAX_OVERFLOW", 20)
+DB_POOL_TIMEOUT: float = env_float("DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE: int = env_int("DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING: bool = env_bool("DB_POOL_PRE_PING", True)
+# Кэш подготовленных выражений asyncpg на соединение (0 — выключить, например за pgbouncer)
+DB_STATEMENT_CACHE_SIZE: int = env_int("DB_STATEMENT_CACHE_SIZE", 100)
+# Ожидание готовности БД при старте: число попыток и максимальная пауза между ними
+DB_CONNECT_RETRIES: int = env_int("DB_CONNECT_RETRIES", 30)
+DB_CONNECT_BACKOFF_MAX: float = env_float("DB_CONNECT_BACKOFF_MAX", 5)
+# Открыть соединения пула заранее, чтобы первые запросы не платили за подключение
+DB_POOL_PREWARM: bool = env_bool("DB_POOL_PREWARM", True)
+
+# Реплика для чтения (необязательно): читающие маршруты идут в неё, записи — в DATABASE_URL
+DATABASE_REPLICA_URL: str = os.getenv("DATABASE_REPLICA_URL")
+# Сколько секунд после записи чтения пользователя и чата идут в primary (read-your-writes)
+DB_READ_YOUR_WRITES_SECONDS: float = env_float("DB_READ_YOUR_WRITES_SECONDS", 5)
+# Отставание реплики, после которого чтения возвращаются в primary, и как часто его проверять
+DB_REPLICA_MAX_LAG_SECONDS: float = env_float("DB_REPLICA_MAX_LAG_SECONDS", 5)
+DB_REPLICA_LAG_CHECK_INTERVAL: float = env_float("DB_REPLICA_LAG_CHECK_INTERVAL", 1)
+
+# Бэкенд pub/sub для рассылки сообщений между воркерами: "memory" или "postgres"
+PUBSUB_BACKEND: str = os.getenv("PUBSUB_BACKEND", "memory")
+
+# Размер очереди исходящих сообщений на одно WebSocket соединение
+WS_SEND_QUEUE_SIZE: int = env_int("WS_SEND_QUEUE_SIZE", 100)
+# Что делать с медленным клиентом при переполнении очереди: "drop_oldest" или "disconnect"
+WS_SLOW_CONSUMER_POLICY: str = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+# Догрузка пропущенного при переподключении (?last_seen=): сообщений в кадре и максимум за раз
+WS_RESUME_BATCH_SIZE: int = env_int("WS_RESUME_BATCH_SIZE", 100)
+WS_RESUME_MAX_MESSAGES: int = env_int("WS_RESUME_MAX_MESSAGES", 5000)
+# Эфемерные события (набор текста, присутствие): не чаще одного за столько мс на пользователя и чат,
+# события внутри интервала сливаются в последнее
+WS_EPHEMERAL_INTERVAL_MS: float = env_float("WS_EPHEMERAL_INTERVAL_MS", 1000)
+
+# Кэш участников чатов: максимальное число чатов и время жизни записи в секундах
+MEMBERSHIP_CACHE_SIZE: int = env_int("MEMBERSHIP_CACHE_SIZE", 10000)
+MEMBERSHIP_CACHE_TTL: float = env_float("MEMBERSHIP_CACHE_TTL", 60)
+
+# Групповая запись сообщений: максимальный размер пачки и сколько ждать её наполнения (мс)
+INGEST_FLUSH_SIZE: int = env_int("INGEST_FLUSH_SIZE", 100)
+INGEST_FLUSH_INTERVAL_MS: float = env_float("INGEST_FLUSH_INTERVAL_MS", 5)
+
+# Список чатов: непрочитанные считаются по индексу (chat_id, id) после водяного знака, но не дальше
+# этого числа — у давно не открывавшегося большого чата клиент покажет "999+", а не пересчитает всю историю
+INBOX_UNREAD_LIMIT: int = env_int("INBOX_UNREAD_LIMIT", 1000)
+
+# Экспорт истории чата: сколько строк читать с серверного курсора за раз
+EXPORT_BATCH_SIZE: int = env_int("EXPORT_BATCH_SIZE", 1000)
+
+# Массовое добавление участников: максимум id в запросе, с какого размера грузить их через COPY
+# и по сколько id связывать в одном запросе без COPY (SQLite принимает не больше 32766 параметров)
+CHAT_MEMBERS_BULK_MAX: int = env_int("CHAT_MEMBERS_BULK_MAX", 50000)
+CHAT_MEMBERS_COPY_THRESHOLD: int = env_int("CHAT_MEMBERS_COPY_THRESHOLD", 10000)
+CHAT_MEMBERS_BULK_CHUNK: int = env_int("CHAT_MEMBERS_BULK_CHUNK", 5000)
+
+# Вложения: каталог хранения (файлы лежат под своим SHA-256), предельный размер файла,
+# сколько байт копить перед записью на диск и сколько вложений можно прикрепить к одному сообщению
+ATTACHMENTS_DIR: str = os.getenv("ATTACHMENTS_DIR", "attachments")
+ATTACHMENT_MAX_BYTES: int = env_int("ATTACHMENT_MAX_BYTES", 50 * 1024 * 1024)
+ATTACHMENT_WRITE_BUFFER: int = env_int("ATTACHMENT_WRITE_BUFFER", 1024 * 1024)
+MESSAGE_ATTACHMENTS_MAX: int = env_int("MESSAGE_ATTACHMENTS_MAX", 10)
+# Префикс internal location в nginx: если задан, файл отдаёт nginx через sendfile, а не воркер
+ATTACHMENTS_ACCEL_REDIRECT: str = os.getenv("ATTACHMENTS_ACCEL_REDIRECT", "").rstrip("/")
+
+# Предельный размер текста сообщения в байтах (в JSON, UTF-8). Проверяется до записи в БД:
+# кадр рассылки должен уложиться в лимит NOTIFY PostgreSQL (7999 байт) вместе с заголовком
+MESSAGE_MAX_BYTES: int = env_int("MESSAGE_MAX_BYTES", 4000)
+
+# Окно (в секундах), в котором одинаковый текст от отправителя считается дубликатом
+MESSAGE_DEDUP_WINDOW_SECONDS: int = env_int("MESSAGE_DEDUP_WINDOW_SECONDS", 10)
+
+# Хэширование паролей: стоимость bcrypt и пул, в котором оно выполняется вне event loop
+BCRYPT_ROUNDS: int = env_int("BCRYPT_ROUNDS", 12)
+PASSWORD_HASH_EXECUTOR: str = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")  # "thread" или "process"
+PASSWORD_HASH_WORKERS: int = env_int("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))
+
+# Кэш проверенных JWT (до истечения exp) и id пользователей по email
+AUTH_TOKEN_CACHE_SIZE: int = env_int("AUTH_TOKEN_CACHE_SIZE", 10000)
+AUTH_USER_CACHE_SIZE: int = env_int("AUTH_USER_CACHE_SIZE", 10000)
+
+# Логирование: уровень, формат ("json" или "text") и доля записываемых событий,
+# например LOG_SAMPLE_RATES="ws.message=0.01,ws.connect=0.5"
+LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")
+# Сколько записей может ждать фонового писателя; лишние отбрасываются
+LOG_QUEUE_SIZE: int = env_int("LOG_QUEUE_SIZE", 10000)
+LOG_SAMPLE_RATES: dict = {
+    event.strip(): float(rate)
+    for event, _, rate in (item.partition("=") for item in os.getenv("LOG_SAMPLE_RATES", "").split(",") if item.strip())
+}
@@ -1,11 +1,20 @@
+import base64
+import hashlib
+import re
+import time
+from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.sql import func, text  # Добавлен `text` для SQL-запросов
 from sqlalchemy.future import select
-from sqlalchemy import insert
-from app.models import User, Chat, Message, chat_members, message_readers
-from app.schemas import UserCreate, MessageCreate, ChatCreate
-from app.websocket import manager
+from sqlalchemy.orm import aliased
+from sqlalchemy import DateTime, Float, Integer, Text, and_, column, exists, insert, literal, or_, table, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models import User, Chat, Message, Attachment, chat_members, message_attachments, SEARCH_TEXT_CONFIG
+from app.schemas import UserCreate, ChatCreate
+from app.cache import membership_cache
+from app.config import MESSAGE_DEDUP_WINDOW_SECONDS, CHAT_MEMBERS_COPY_THRESHOLD, CHAT_MEMBERS_BULK_CHUNK, INBOX_UNREAD_LIMIT
 
 # ✅ Создание нового пользователя
 async def create_user(db: AsyncSession, user: UserCreate):
@@ -28,24 +37,153 @@ async def get_user_by_email(db: AsyncSession, email: str):
     result = await db.execute(select(User).where(User.email == email))
     return result.scalars().first()
 
-async def create_message(db: AsyncSession, chat_id: int, sender_id: int, text: str):
+# 🔐 Обновление хэша пароля (перехэширование при входе)
+async def update_user_password(db: AsyncSession, user: User, hashed_password: str):
+    user.password = hashed_password
+    await db.commit()
+
+def message_dedup_key(text: str, client_id: str = None, attachment_ids=()) -> str:
+    """Компактный ключ идемпотентности сообщения.
+
+    Если клиент прислал свой id сообщения — используем его. Иначе берём хэш текста (и id вложений)
+    в пределах окна MESSAGE_DEDUP_WINDOW_SECONDS, чтобы повтор "ок" через минуту не считался дубликатом.
+    Повтор, попавший в следующее окно, ловит create_messages_bulk по ключу прошлого окна (previous_window_key).
+    """
+    if client_id:
+        # Длинные id клиента сжимаем хэшем, чтобы ключ помещался в String(64)
+        if len(client_id) > 60:
+            client_id = hashlib.sha256(client_id.encode()).hexdigest()[:40]
+        return f"c:{client_id}"
+    bucket = int(time.time() // MESSAGE_DEDUP_WINDOW_SECONDS)
+    if attachment_ids:
+        text = f"{text}\0{','.join(map(str, attachment_ids))}"  # Разные файлы с одной подписью — разные сообщения
+    return f"h:{bucket}:{hashlib.sha256(text.encode()).hexdigest()[:40]}"
+
+def previous_window_key(dedup_key: str):
+    """Ключ того же текста в предыдущем окне дедупликации; None для ключей клиента"""
+    if not dedup_key.startswith("h:"):
+        return None
+    _, bucket, digest = dedup_key.split(":")
+    return f"h:{int(bucket) - 1}:{digest}"
+
+def timestamp_param(db: AsyncSession, timestamp: datetime):
+    """Значение для сравнения с Message.timestamp"""
+    if db.bind.dialect.name == "sqlite":
+        # SQLite хранит CURRENT_TIMESTAMP текстом в UTC до секунд, а параметр DateTime пишется с ".000000":
+        # текст сравнивается посимвольно, поэтому приводим значение к формату колонки
+        if timestamp.tzinfo:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        timespec = "microseconds" if timestamp.microsecond else "seconds"
+        return literal(timestamp.isoformat(sep=" ", timespec=timespec), Text)
+    return timestamp
+
+def dialect_insert(db: AsyncSession, table):
+    """INSERT с поддержкой ON CONFLICT для текущей СУБД"""
+    if db.bind.dialect.name == "sqlite":
+        return sqlite_insert(table)
+    return pg_insert(table)
+
+async def create_message(db: AsyncSession, chat_id: int, sender_id: int, text: str, client_id: str = None,
+                         attachment_ids=()):
     """Создание нового сообщения с защитой от дубликатов"""
-    existing_message = await db.execute(
-        select(Message)
-        .where(Message.chat_id == chat_id, Message.sender_id == sender_id, Message.text == text)
-    )
-    if existing_message.scalars().first():
-        return {"error": "⚠️ Сообщение уже отправлено"}
+    results = await create_messages_bulk(db, [(chat_id, sender_id, text, client_id, attachment_ids)])
+    return results[0]
+
+async def create_messages_bulk(db: AsyncSession, items: list):
+    """Запись пачки сообщений (chat_id, sender_id, text, client_id, attachment_ids) одним INSERT ... ON CONFLICT и одним коммитом.
+
+    Возвращает список той же длины: сохранённое сообщение или {"error": ...} для дубликата.
+    Если БД отвергла пачку из-за данных (ограничение, недопустимое значение), она переписывается
+    по одной строке: ошибку получает только виновная. Потеря соединения по-прежнему поднимается наверх.
+    """
+    keys, rows, attachments = [], {}, {}
+    for chat_id, sender_id, body, client_id, attachment_ids in items:
+        key = (chat_id, sender_id, message_dedup_key(body, client_id, attachment_ids))
+        keys.append(key)
+        if key not in rows:
+            rows[key] = {"chat_id": chat_id, "sender_id": sender_id, "text": body, "dedup_key": key[2], "read": False}
+            if attachment_ids:
+                attachments[key] = attachment_ids
+
+    # Повтор на границе окон: тот же текст мог попасть в прошлое окно меньше MESSAGE_DEDUP_WINDOW_SECONDS назад.
+    # Один запрос по тому же уникальному индексу на всю пачку
+    previous = {}
+    for key in rows:
+        previous_key = previous_window_key(key[2])
+        if previous_key:
+            previous[(key[0], key[1], previous_key)] = key
+    if previous:
+        since = datetime.fromtimestamp(time.time() - MESSAGE_DEDUP_WINDOW_SECONDS, timezone.utc)
+        recent = await db.execute(
+            select(Message.chat_id, Message.sender_id, Message.dedup_key)
+            .where(tuple_(Message.chat_id, Message.sender_id, Message.dedup_key).in_(list(previous)))
+            .where(Message.timestamp >= timestamp_param(db, since))
+        )
+        for row in recent:
+            rows.pop(previous[tuple(row)], None)
+            attachments.pop(previous[tuple(row)], None)
 
-    new_message = Message(chat_id=chat_id, sender_id=sender_id, text=text, read=False)
-    db.add(new_message)
+    # Дубликаты в текущем окне отсекает уникальный индекс (chat_id, sender_id, dedup_key) без отдельного SELECT
+    stmt = (
+        dialect_insert(db, Message)
+        .on_conflict_do_nothing(index_elements=["chat_id", "sender_id", "dedup_key"])
+        .returning(Message)
+    )
     try:
+        stored = {}
+        if rows:
+            inserted = await db.scalars(stmt, list(rows.values()))
+            stored = {(message.chat_id, message.sender_id, message.dedup_key): message for message in inserted.all()}
+        if stored:
+            await update_chat_last_message(db, list(stored.values()))
+            links = [
+                {"message_id": stored[key].id, "attachment_id": attachment_id}
+                for key, attachment_ids in attachments.items() if key in stored
+                for attachment_id in attachment_ids
+            ]
+            if links:
+                await db.execute(insert(message_attachments), links)
         await db.commit()
-        await db.refresh(new_message)
-        return new_message
-    except IntegrityError:
+    except DBAPIError as e:
+        # Одна плохая строка (удалённый чат или вложение, недопустимый текст) не должна ронять всю пачку — пишем по одному
         await db.rollback()
-        return {"error": "⚠️ Сообщение уже существует"}
+        if e.connection_invalidated:
+            raise
+        if len(items) == 1:
+            return [{"error": "❌ Сообщение не сохранено"}]
+        results = []
+        for item in items:
+            result = (await create_messages_bulk(db, [item]))[0]
+            if isinstance(result, Message):
+                db.expunge(result)  # Откат следующей строки сбросил бы атрибуты уже сохранённых
+            results.append(result)
+        return results
+
+    results = []
+    for key in keys:
+        # Повтор внутри той же пачки тоже считается дубликатом
+        message = stored.pop(key, None)
+        results.append(message if message is not None else {"error": "⚠️ Сообщение уже отправлено"})
+    return results
+
+# 📥 Последнее сообщение чата для списка чатов
+async def update_chat_last_message(db: AsyncSession, messages: list):
+    """Обновляем chats.last_message_id в транзакции записи сообщений.
+
+    Одна строка на чат, а не на каждого участника: непрочитанные считает get_user_chats по водяному знаку.
+    """
+    last_ids = {}
+    for message in messages:
+        last_ids[message.chat_id] = max(message.id, last_ids.get(message.chat_id, 0))
+
+    # Строки обновляются в одном порядке на всех воркерах, чтобы пачки не ждали друг друга по кругу
+    await db.execute(
+        text("""
+            UPDATE chats SET last_message_id = :message_id
+            WHERE id = :chat_id AND COALESCE(last_message_id, 0) < :message_id
+        """),
+        [{"chat_id": chat_id, "message_id": message_id} for chat_id, message_id in sorted(last_ids.items())]
+    )
 
 # ✅ Создание нового чата
 async def create_chat(db: AsyncSession, chat: ChatCreate):
@@ -78,100 +216,455 @@ async def add_chat_member(db: AsyncSession, chat_id: int, user_id: int):
     stmt = insert(chat_members).values(chat_id=chat_id, user_id=user_id)
     await db.execute(stmt)
     await db.commit()
+    await membership_cache.invalidate(chat_id)
 
     return {"message": f"✅ Пользователь {user_id} добавлен в чат {chat_id}"}
 
-# ✅ Получение списка участников чата
+# 👥 Массовое добавление пользователей в чат
+async def add_chat_members_bulk(db: AsyncSession, chat_id: int, user_ids: list):
+    """Добавляет сразу много пользователей за постоянное число запросов, а не по четыре на каждого.
+
+    Существование пользователей проверяется одним запросом, вставка — одним INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+    Очень большие списки на PostgreSQL загружаются во временную таблицу через COPY вместо тысяч параметров,
+    в остальных случаях id идут пачками по CHAT_MEMBERS_BULK_CHUNK, чтобы не упереться в лимит параметров запроса.
+    """
+    chat = await db.get(Chat, chat_id)
+    if not chat:
+        return {"error": "Чат не найден"}
+
+    user_ids = list(dict.fromkeys(user_ids))
+    if db.bind.dialect.name == "postgresql" and len(user_ids) >= CHAT_MEMBERS_COPY_THRESHOLD:
+        chunks = [select((await copy_user_ids(db, user_ids)).c.user_id)]
+    else:
+        chunks = [user_ids[start:start + CHAT_MEMBERS_BULK_CHUNK] for start in range(0, len(user_ids), CHAT_MEMBERS_BULK_CHUNK)]
+
+    found = added = 0
+    for requested in chunks:
+        existing = User.id.in_(requested)
+        found += await db.scalar(select(func.count()).select_from(User).where(existing))
+
+        stmt = (
+            dialect_insert(db, chat_members)
+            .from_select(
+                ["chat_id", "user_id", "role"],
+                select(literal(chat_id, Integer), User.id, literal("member")).where(existing),
+            )
+            .on_conflict_do_nothing(index_elements=["chat_id", "user_id"])
+        )
+        added += (await db.execute(stmt)).rowcount
+    await db.commit()  # Все пачки — одна транзакция
+    if added:
+        await membership_cache.invalidate(chat_id)  # Одна инвалидация на весь список
+
+    return {"chat_id": chat_id, "added": added, "skipped": found - added, "missing": len(user_ids) - found}
+
+async def copy_user_ids(db: AsyncSession, user_ids: list):
+    """Загружаем id через COPY во временную таблицу транзакции и возвращаем её"""
+    await db.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS bulk_member_ids (user_id INTEGER PRIMARY KEY) ON COMMIT DELETE ROWS"
+    ))
+    connection = await (await db.connection()).get_raw_connection()
+    await connection.driver_connection.copy_records_to_table(
+        "bulk_member_ids", records=[(user_id,) for user_id in user_ids], columns=["user_id"]
+    )
+    return table("bulk_member_ids", column("user_id"))
+
+# ✅ Получение списка участников чата (через кэш участников)
 async def get_chat_members(db: AsyncSession, chat_id: int):
+    cached = membership_cache.get(chat_id)
+    if cached is not None:
+        return cached
+
+    generation = membership_cache.generation
     result = await db.execute(
         select(User.id, User.name)
         .join(chat_members, User.id == chat_members.c.user_id)
         .where(chat_members.c.chat_id == chat_id)
     )
     members = result.fetchall()
-    return {"chat_id": chat_id, "members": [{"id": user.id, "name": user.name} for user in members]}
+    chat = {"chat_id": chat_id, "members": [{"id": user.id, "name": user.name} for user in members]}
+    if not db.info.get("replica"):
+        # Реплика может не видеть последних изменений состава, а кэш общий для всех маршрутов
+        membership_cache.set(chat_id, chat, generation)
+    return chat
+
+# 🔎 Проверка, состоит ли пользователь в чате
+async def is_chat_member(db: AsyncSession, chat_id: int, user_id: int) -> bool:
+    members = await get_chat_members(db, chat_id)
+    return any(member["id"] == user_id for member in members["members"])
+
+# 🔖 Курсор страницы истории: непрозрачная строка с (timestamp, id) сообщения
+def encode_cursor(message) -> str:
+    raw = f"{message.timestamp.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
-# ✅ Получение истории сообщений
-async def get_messages(db: AsyncSession, chat_id: int, limit: int = 10, offset: int = 0):
+def decode_cursor(cursor: str):
+    """Разбираем курсор, ValueError — если он повреждён"""
+    try:
+        timestamp, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Некорректный курсор") from e
+
+def cursor_position(db: AsyncSession, cursor: str):
+    """(timestamp, id) курсора для сравнения с tuple_(Message.timestamp, Message.id)"""
+    timestamp, message_id = decode_cursor(cursor)
+    return tuple_(timestamp_param(db, timestamp), message_id)
+
+# 📥 Список чатов пользователя с последним сообщением и числом непрочитанных
+async def get_user_chats(db: AsyncSession, user_id: int, limit: int = 50):
+    """Один запрос: участие -> чат -> последнее сообщение, самые свежие чаты первыми.
+
+    Непрочитанные — чужие сообщения после водяного знака: диапазон индекса (chat_id, id),
+    просмотр которого обрывается на INBOX_UNREAD_LIMIT.
+    """
+    unread_messages = aliased(Message)
+    after_watermark = (
+        select(literal(1))
+        .where(
+            unread_messages.chat_id == chat_members.c.chat_id,
+            unread_messages.id > func.coalesce(chat_members.c.last_read_message_id, 0),
+            unread_messages.sender_id != user_id,
+        )
+        .limit(INBOX_UNREAD_LIMIT)
+        .correlate(chat_members)
+        .subquery()
+    )
+    unread = select(func.count()).select_from(after_watermark).scalar_subquery()
     result = await db.execute(
-        select(Message)
-        .filter(Message.chat_id == chat_id)
-        .order_by(Message.timestamp)
+        select(
+            Chat.id, Chat.name, Chat.chat_type,
+            unread.label("unread_count"), chat_members.c.last_read_message_id,
+            Message.id.label("message_id"), Message.sender_id, Message.text, Message.timestamp,
+        )
+        .select_from(chat_members)
+        .join(Chat, Chat.id == chat_members.c.chat_id)
+        .outerjoin(Message, Message.id == Chat.last_message_id)
+        .where(chat_members.c.user_id == user_id)
+        .order_by(func.coalesce(Chat.last_message_id, 0).desc(), Chat.id.desc())
         .limit(limit)
-        .offset(offset)
     )
-    return result.scalars().all()
+    return [
+        {
+            "chat_id": row.id,
+            "name": row.name,
+            "chat_type": row.chat_type,
+            "unread_count": row.unread_count,
+            "last_read_message_id": row.last_read_message_id,
+            "last_message": None if row.message_id is None else {
+                "id": row.message_id, "sender_id": row.sender_id, "text": row.text, "timestamp": row.timestamp,
+            },
+        }
+        for row in result
+    ]
 
+# Колонки ответа истории (как в MessageResponse): строки-кортежи вместо ORM-объектов Message
+MESSAGE_COLUMNS = (
+    Message.id, Message.chat_id, Message.sender_id, Message.text, Message.timestamp, Message.read, Message.read_count,
+)
 
-# ✅ Отметка сообщения как прочитанного
-async def mark_message_as_read(db: AsyncSession, message_id: int, user_email: str):
-    """Отмечает сообщение как прочитанное пользователем"""
+# ✅ Получение истории сообщений (keyset-пагинация по индексу chat_id, timestamp, id)
+async def get_messages(db: AsyncSession, chat_id: int, limit: int = 10, before: str = None, after: str = None):
+    """Страница истории в хронологическом порядке.
+
+    Без курсора — самые старые сообщения; after — следующие за курсором, before — предыдущие.
+    id разрешает совпадения timestamp (сообщения одной пачки пишутся с одинаковым временем).
+    Возвращает строки с колонками MESSAGE_COLUMNS, без загрузки ORM-объектов.
+    """
+    query = select(*MESSAGE_COLUMNS).filter(Message.chat_id == chat_id)
+    position = tuple_(Message.timestamp, Message.id)
+
+    if before:
+        query = query.filter(position < cursor_position(db, before)).order_by(Message.timestamp.desc(), Message.id.desc())
+    else:
+        if after:
+            query = query.filter(position > cursor_position(db, after))
+        query = query.order_by(Message.timestamp, Message.id)
+
+    result = await db.execute(query.limit(limit))
+    messages = result.all()
+    if before:
+        messages.reverse()
+    return messages
+
+# 📎 Вложения
+async def create_attachment(db: AsyncSession, sha256: str, size: int, content_type: str, filename: str, uploader_id: int):
+    attachment = Attachment(sha256=sha256, size=size, content_type=content_type, filename=filename, uploader_id=uploader_id)
+    db.add(attachment)
+    await db.commit()
+    return attachment
 
-    # 1️⃣ Проверяем, существует ли сообщение
-    message = await db.execute(
-        text("SELECT sender_id, chat_id FROM messages WHERE id = :message_id"),
-        {"message_id": message_id}
+async def count_own_attachments(db: AsyncSession, attachment_ids, uploader_id: int) -> int:
+    """Сколько из attachment_ids загрузил этот пользователь: прикреплять можно только свои файлы"""
+    result = await db.execute(
+        select(func.count()).select_from(Attachment)
+        .where(Attachment.id.in_(attachment_ids), Attachment.uploader_id == uploader_id)
     )
-    message_data = message.fetchone()
+    return result.scalar()
 
-    if not message_data:
-        return {"error": "Сообщение не найдено"}
-    
-    sender_id, chat_id = message_data  # Отправитель и чат ID
+async def get_attachment_for_user(db: AsyncSession, attachment_id: int, user_id: int):
+    """Вложение, если пользователь его загрузил или состоит в чате, куда оно отправлено"""
+    shared = (
+        select(message_attachments.c.attachment_id)
+        .join(Message, Message.id == message_attachments.c.message_id)
+        .join(chat_members, and_(chat_members.c.chat_id == Message.chat_id, chat_members.c.user_id == user_id))
+        .where(message_attachments.c.attachment_id == attachment_id)
+    )
+    result = await db.execute(
+        select(Attachment).where(Attachment.id == attachment_id, or_(Attachment.uploader_id == user_id, exists(shared)))
+    )
+    return result.scalars().first()
 
-    # 2️⃣ Получаем user_id по email
-    user = await db.execute(text("SELECT id FROM users WHERE email = :email"), {"email": user_email})
-    user_id = user.scalar()
+async def get_message_attachments(db: AsyncSession, message_ids: list) -> dict:
+    """id сообщения -> список его вложений; один запрос на страницу сообщений"""
+    if not message_ids:
+        return {}
+    result = await db.execute(
+        select(message_attachments.c.message_id, Attachment.id, Attachment.filename, Attachment.size, Attachment.content_type)
+        .join(Attachment, Attachment.id == message_attachments.c.attachment_id)
+        .where(message_attachments.c.message_id.in_(message_ids))
+        .order_by(message_attachments.c.message_id, Attachment.id)
+    )
+    attachments = {}
+    for row in result:
+        attachments.setdefault(row.message_id, []).append(
+            {"id": row.id, "filename": row.filename, "size": row.size, "content_type": row.content_type}
+        )
+    return attachments
 
-    if not user_id:
-        return {"error": "Пользователь не найден"}
+# 🔎 Полнотекстовый поиск: score — чем больше, тем релевантнее; (score, id) — ключ keyset-пагинации
+SEARCH_SQL = {
+    "postgresql": f"""
+        SELECT m.id, m.sender_id, m.text, m.timestamp, ts_rank(m.search_vector, query) AS score
+        FROM messages m, websearch_to_tsquery('{SEARCH_TEXT_CONFIG}', :query) query
+        WHERE m.chat_id = :chat_id AND m.search_vector @@ query
+    """,
+    "sqlite": """
+        SELECT m.id, m.sender_id, m.text, m.timestamp, -bm25(messages_fts) AS score
+        FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+        WHERE messages_fts MATCH :query AND m.chat_id = :chat_id
+    """,
+}
+
+def encode_search_cursor(result: dict) -> str:
+    raw = f"{result['score']!r}|{result['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
-    # 3️⃣ Проверяем, не было ли уже прочитано этим пользователем
-    already_read = await db.execute(
-        text("SELECT 1 FROM message_readers WHERE message_id = :message_id AND user_id = :user_id"),
-        {"message_id": message_id, "user_id": user_id}
+def decode_search_cursor(cursor: str):
+    """Разбираем курсор поиска, ValueError — если он повреждён"""
+    try:
+        score, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return float(score), int(message_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Некорректный курсор") from e
+
+async def search_messages(db: AsyncSession, chat_id: int, query: str, limit: int = 20, after: str = None):
+    """Поиск по индексу сообщений чата, самые релевантные первыми"""
+    dialect = db.bind.dialect.name
+    if dialect == "sqlite":
+        # Слова пользователя берём в кавычки, чтобы не разбирать синтаксис запросов FTS5
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        query = " ".join(f'"{word}"' for word in words)
+
+    params = {"chat_id": chat_id, "query": query, "limit": limit}
+    position = ""
+    if after:
+        params["score"], params["id"] = decode_search_cursor(after)
+        score = "CAST(:score AS REAL)"
+        position = f"WHERE score < {score} OR (score = {score} AND id < :id)"
+
+    stmt = text(f"""
+        SELECT id, sender_id, text, timestamp, score FROM ({SEARCH_SQL[dialect]}) ranked
+        {position}
+        ORDER BY score DESC, id DESC
+        LIMIT :limit
+    """).columns(id=Integer, sender_id=Integer, text=Text, timestamp=DateTime(timezone=True), score=Float)
+    result = await db.execute(stmt, params)
+    return [dict(row._mapping) for row in result]
+
+# 🔁 Сообщения после last_seen для догрузки при переподключении
+async def stream_messages_after(db: AsyncSession, chat_id: int, after_id: int, batch_size: int, limit: int = None):
+    """Асинхронный генератор пачек сообщений чата с id > after_id в порядке id.
+
+    Строки читаются серверным курсором по batch_size, а не одним списком в памяти:
+    одновременно в памяти не больше одной пачки, сколько бы сообщений ни было в чате.
+    """
+    result = await db.stream(
+        select(Message.id, Message.sender_id, Message.text, Message.timestamp)
+        .where(Message.chat_id == chat_id, Message.id > after_id)
+        .order_by(Message.id)
+        .limit(limit)
+        .execution_options(yield_per=batch_size)
     )
+    async for rows in result.partitions():
+        yield rows
 
-    if already_read.fetchone():
-        return {"message": f"Сообщение {message_id} уже прочитано пользователем {user_id}"}
+# ✅ Отметка сообщения как прочитанного
+MARK_READ_SQL = text("""
+    WITH msg AS (
+        -- FOR UPDATE: параллельные читатели выстраиваются в очередь и видят актуальный read.
+        -- Сообщение видно только участнику его чата
+        SELECT m.id, m.sender_id, m.chat_id, m.read FROM messages m
+        JOIN chat_members cm ON cm.chat_id = m.chat_id AND cm.user_id = :user_id
+        WHERE m.id = :message_id
+        FOR UPDATE OF m
+    ), inserted AS (
+        -- Отправитель своё сообщение не "читает": в счётчике только остальные участники
+        INSERT INTO message_readers (message_id, user_id)
+        SELECT msg.id, CAST(:user_id AS INTEGER) FROM msg WHERE msg.sender_id != :user_id
+        ON CONFLICT DO NOTHING
+        RETURNING message_id
+    ), updated AS (
+        UPDATE messages m
+        SET read_count = m.read_count + 1,
+            read = m.read OR m.read_count + 1 >= (
+                SELECT COUNT(*) FROM chat_members cm WHERE cm.chat_id = m.chat_id AND cm.user_id != m.sender_id
+            )
+        FROM inserted, msg
+        WHERE m.id = inserted.message_id
+        -- Только переход "не прочитано" -> "прочитано всеми": поздние читатели его уже не повторяют
+        RETURNING m.read_count, m.read AND NOT msg.read AS became_read
+    )
+    SELECT msg.sender_id, msg.chat_id, updated.read_count, updated.became_read AS fully_read
+    FROM msg
+    LEFT JOIN updated ON TRUE
+""")
 
-    # 4️⃣ Отмечаем сообщение как прочитанное этим пользователем
-    await db.execute(
+async def mark_message_as_read(db: AsyncSession, message_id: int, user_id: int):
+    """Отмечает сообщение как прочитанное пользователем.
+
+    Добавление читателя, увеличение messages.read_count и проверка "прочитано всеми"
+    выполняются одним запросом. fully_read=True возвращается только тому вызову,
+    после которого сообщение стало полностью прочитанным. Читателем считается только
+    участник чата, кроме отправителя; для остальных сообщение "не найдено".
+    """
+    params = {"message_id": message_id, "user_id": user_id}
+    if db.bind.dialect.name == "postgresql":
+        row = (await db.execute(MARK_READ_SQL, params)).fetchone()
+    else:
+        row = await _mark_message_as_read_generic(db, params)
+    await db.commit()
+
+    if not row:
+        return {"error": "Сообщение не найдено"}
+    sender_id, chat_id, read_count, fully_read = row
+    if sender_id == user_id:
+        return {"message": f"Сообщение {message_id} отправлено пользователем {user_id}", "fully_read": False}
+    if read_count is None:
+        return {"message": f"Сообщение {message_id} уже прочитано пользователем {user_id}", "fully_read": False}
+
+    if fully_read:
+        return {"message": f"Сообщение {message_id} полностью прочитано!", "fully_read": True, "sender_id": sender_id}
+    return {"message": f"Пользователь {user_id} отметил сообщение {message_id} как прочитанное", "fully_read": False}
+
+async def _mark_message_as_read_generic(db: AsyncSession, params: dict):
+    """Тот же результат, что MARK_READ_SQL, для СУБД без INSERT/UPDATE внутри CTE (SQLite)"""
+    message = (await db.execute(
         text("""
-            INSERT INTO message_readers (message_id, user_id)
-            VALUES (:message_id, :user_id)
-            ON CONFLICT DO NOTHING
+            SELECT m.sender_id, m.chat_id FROM messages m
+            JOIN chat_members cm ON cm.chat_id = m.chat_id AND cm.user_id = :user_id
+            WHERE m.id = :message_id
         """),
-        {"message_id": message_id, "user_id": user_id}
-    )
-    await db.commit()
+        params
+    )).fetchone()
+    if not message or message.sender_id == params["user_id"]:
+        return (*message, None, None) if message else None
 
-    # 5️⃣ Проверяем количество участников чата (кроме отправителя)
-    total_members = await db.execute(
-        text("SELECT COUNT(*) FROM chat_members WHERE chat_id = :chat_id AND user_id != :sender_id"),
-        {"chat_id": chat_id, "sender_id": sender_id}
+    inserted = await db.execute(
+        text("INSERT INTO message_readers (message_id, user_id) VALUES (:message_id, :user_id) ON CONFLICT DO NOTHING"),
+        params
     )
-    total_members = total_members.scalar()  # Убираем отправителя из подсчета
+    if not inserted.rowcount:
+        return (*message, None, None)
 
-    # 6️⃣ Проверяем, сколько уже прочитали
-    read_count = await db.execute(
-        text("SELECT COUNT(*) FROM message_readers WHERE message_id = :message_id"),
-        {"message_id": message_id}
+    read_count = (await db.execute(
+        text("UPDATE messages SET read_count = read_count + 1 WHERE id = :message_id RETURNING read_count"), params
+    )).scalar()
+    # Флаг ставит только тот вызов, который его перевёл: rowcount = 1 ровно один раз
+    became_read = await db.execute(
+        text("""
+            UPDATE messages SET read = TRUE
+            WHERE id = :message_id AND NOT read AND read_count >= (
+                SELECT COUNT(*) FROM chat_members cm WHERE cm.chat_id = messages.chat_id AND cm.user_id != messages.sender_id
+            )
+        """),
+        params
     )
-    read_count = read_count.scalar()
+    return (*message, read_count, became_read.rowcount == 1)
 
-    # Логирование
-    print(f"📊 Всего участников (без отправителя): {total_members}, Прочитали: {read_count}")
 
-    # 7️⃣ Если **все, кроме отправителя** прочли → Отмечаем "полностью прочитано"
-    if read_count == total_members:
+# Пространство ключей pg_advisory_xact_lock(namespace, chat_id) для сдвига водяных знаков
+READ_WATERMARK_LOCK_NAMESPACE = 1
+
+# 📖 Продвижение водяного знака прочтения ("прочитано всё до up_to")
+async def advance_read_watermark(db: AsyncSession, chat_id: int, user_id: int, up_to: int):
+    """Сдвигает last_read_message_id участника вперёд одним UPDATE.
+
+    Сообщение считается полностью прочитанным, когда минимальный водяной знак остальных
+    участников (кроме отправителя) не меньше его id. Возвращает сообщения, которые стали
+    полностью прочитанными после этого сдвига.
+
+    Сдвиги в одном чате на PostgreSQL выполняются по очереди (advisory-блокировка транзакции на чат):
+    иначе два последних читателя при READ COMMITTED не видят новых водяных знаков друг друга,
+    и сообщение так и не становится прочитанным всеми.
+    """
+    if db.bind.dialect.name == "postgresql":
+        # Одна блокировка на чат, а не FOR UPDATE всех строк участников: не растёт с размером чата
+        # и не конфликтует с записью сообщений (UPDATE chats)
         await db.execute(
-            text("UPDATE messages SET read = TRUE WHERE id = :message_id"),
-            {"message_id": message_id}
+            text("SELECT pg_advisory_xact_lock(:namespace, :chat_id)"),
+            {"namespace": READ_WATERMARK_LOCK_NAMESPACE, "chat_id": chat_id}
         )
-        await db.commit()
+    state = await db.execute(
+        text("""
+            SELECT cm.last_read_message_id,
+                   (SELECT MAX(id) FROM messages WHERE chat_id = :chat_id AND id <= :up_to)
+            FROM chat_members cm
+            WHERE cm.chat_id = :chat_id AND cm.user_id = :user_id
+        """),
+        {"chat_id": chat_id, "user_id": user_id, "up_to": up_to}
+    )
+    row = state.fetchone()
+    if not row:
+        return {"error": "Пользователь не состоит в чате"}
+
+    previous, up_to = row[0] or 0, row[1] or 0  # up_to не может обогнать последнее сообщение чата
+    if up_to <= previous:
+        return {"chat_id": chat_id, "last_read_message_id": previous, "fully_read": []}
+
+    updated = await db.execute(
+        text("""
+            UPDATE chat_members SET last_read_message_id = :up_to
+            WHERE chat_id = :chat_id AND user_id = :user_id AND COALESCE(last_read_message_id, 0) < :up_to
+        """),
+        {"chat_id": chat_id, "user_id": user_id, "up_to": up_to}
+    )
+    if not updated.rowcount:
+        # Параллельный запрос уже сдвинул водяной знак дальше — отдаём сохранённый
+        await db.rollback()
+        stored = await db.scalar(
+            select(chat_members.c.last_read_message_id)
+            .where(chat_members.c.chat_id == chat_id, chat_members.c.user_id == user_id)
+        )
+        return {"chat_id": chat_id, "last_read_message_id": stored, "fully_read": []}
 
-        print(f"✅ Сообщение {message_id} полностью прочитано!")
-        return {"message": f"Сообщение {message_id} полностью прочитано!"}
+    # Проверять нужно только сообщения между старым и новым водяным знаком
+    fully_read = await db.execute(
+        text("""
+            UPDATE messages SET read = TRUE
+            WHERE chat_id = :chat_id AND id > :previous AND id <= :up_to
+              AND sender_id != :user_id AND NOT read
+              AND id <= (
+                  SELECT MIN(COALESCE(cm.last_read_message_id, 0)) FROM chat_members cm
+                  WHERE cm.chat_id = messages.chat_id AND cm.user_id != messages.sender_id
+              )
+            RETURNING id, sender_id
+        """),
+        {"chat_id": chat_id, "user_id": user_id, "previous": previous, "up_to": up_to}
+    )
+    fully_read = [{"id": message_id, "sender_id": sender_id} for message_id, sender_id in fully_read.fetchall()]
+    await db.commit()
 
-    return {"message": f"Пользователь {user_id} отметил сообщение {message_id} как прочитанное"}
\ No newline at end of file
+    return {"chat_id": chat_id, "last_read_message_id": up_to, "fully_read": fully_read}
@@ -1,21 +1,142 @@
+import asyncio
+import logging
 import time
-import os
+import uuid
+from sqlalchemy import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from dotenv import load_dotenv
-from typing import AsyncGenerator
+from sqlalchemy.sql import text
+from typing import AsyncGenerator, Optional
+from app.config import (
+    DATABASE_URL, DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING, DB_STATEMENT_CACHE_SIZE, DB_CONNECT_RETRIES, DB_CONNECT_BACKOFF_MAX,
+    DATABASE_REPLICA_URL, DB_READ_YOUR_WRITES_SECONDS, DB_REPLICA_MAX_LAG_SECONDS, DB_REPLICA_LAG_CHECK_INTERVAL,
+)
+from app.log import log_event
+from app.metrics import Counter, instrument_engine
 
-load_dotenv()
+def engine_options(url: str) -> dict:
+    """Параметры пула и драйвера для create_async_engine"""
+    options = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING}
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return options  # У SQLite свой пул, настройки размера к нему не применяются
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    if url.get_driver_name() == "asyncpg":
+        # Запросы SQLAlchemy готовит сама и кэширует в prepared_statement_cache_size;
+        # statement_cache_size — отдельный кэш asyncpg для его собственных запросов
+        connect_args = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE, "statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+        if not DB_STATEMENT_CACHE_SIZE:
+            # За pgbouncer (pool_mode=transaction) клиенты делят серверные соединения:
+            # уникальные имена не дают подготовленным выражениям столкнуться
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+        options["connect_args"] = connect_args
+    return options
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-# Подождем, пока PostgreSQL будет готов
-time.sleep(5)
-
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+instrument_engine(engine)  # Время каждого SQL выражения попадает в /metrics
 SessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
 Base = declarative_base()
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with SessionLocal() as session:
         yield session
+
+# Отставание реплики PostgreSQL в секундах; 0 — если она догнала primary (простаивающий primary не в счёт)
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+db_read_routing_total = Counter("db_read_routing_total", "Куда направлены читающие сессии", ("target", "reason"))
+
+class ReadRouter:
+    """Выбирает фабрику сессий для чтения: реплика или primary.
+
+    Primary выбирается, если реплики нет, если клиент писал меньше sticky_seconds назад — чтобы автор
+    сразу видел своё, — или если реплика отстала больше max_lag. Время последней записи приносит сам клиент
+    (cookie или заголовок, см. app.dependencies.mark_write), поэтому правило работает на любом воркере.
+    """
+
+    def __init__(self, primary: async_sessionmaker, replica: async_sessionmaker = None,
+                 sticky_seconds: float = DB_READ_YOUR_WRITES_SECONDS, max_lag: float = DB_REPLICA_MAX_LAG_SECONDS,
+                 lag_check_interval: float = DB_REPLICA_LAG_CHECK_INTERVAL):
+        self.primary = primary
+        self.replica = replica
+        self.sticky_seconds = sticky_seconds
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.lag = 0.0
+        self._lag_checked_at = float("-inf")
+
+    def is_sticky(self, last_write: Optional[float]) -> bool:
+        """Клиент писал недавно; время записи — по часам сервера (unix time)"""
+        return last_write is not None and time.time() - last_write < self.sticky_seconds
+
+    async def check_lag(self) -> float:
+        """Отставание реплики; запрос к ней не чаще раза в lag_check_interval, недоступная реплика — бесконечно отстала"""
+        now = time.monotonic()
+        if now - self._lag_checked_at < self.lag_check_interval:
+            return self.lag
+        self._lag_checked_at = now  # Параллельные запросы пока используют прошлое значение
+        try:
+            async with self.replica() as session:
+                if session.bind.dialect.name == "postgresql":
+                    self.lag = float(await session.scalar(REPLICA_LAG_SQL))
+                else:
+                    await session.execute(text("SELECT 1"))
+                    self.lag = 0.0
+        except Exception:
+            self.lag = float("inf")
+        return self.lag
+
+    async def session_factory(self, last_write: Optional[float] = None) -> async_sessionmaker:
+        if self.replica is None:
+            return self.primary
+        if self.is_sticky(last_write):
+            db_read_routing_total.inc(1, "primary", "read_your_writes")
+            return self.primary
+        if await self.check_lag() > self.max_lag:
+            db_read_routing_total.inc(1, "primary", "replica_lag")
+            return self.primary
+        db_read_routing_total.inc(1, "replica", "ok")
+        return self.replica
+
+replica_engine = None
+ReplicaSessionLocal = None
+if DATABASE_REPLICA_URL:
+    replica_engine = create_async_engine(DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL))
+    instrument_engine(replica_engine)
+    # info["replica"]: crud не кладёт в общие кэши то, что прочитано из отстающей реплики
+    ReplicaSessionLocal = async_sessionmaker(bind=replica_engine, expire_on_commit=False, info={"replica": True})
+
+read_router = ReadRouter(SessionLocal, ReplicaSessionLocal)
+
+async def wait_for_db(retries: int = DB_CONNECT_RETRIES, backoff_max: float = DB_CONNECT_BACKOFF_MAX):
+    """Ждём готовности БД: повторяем подключение с экспоненциальной паузой вместо фиксированного sleep"""
+    delay = 0.1
+    for attempt in range(1, retries + 1):
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            return
+        except Exception:
+            if attempt == retries:
+                raise
+            log_event(logging.WARNING, "db.unavailable", attempt=attempt, retries=retries, retry_in=round(delay, 1))
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, backoff_max)
+
+async def prewarm_pool(size: int = DB_POOL_SIZE):
+    """Открываем соединения пула заранее, чтобы первые запросы не ждали подключения"""
+    if engine.dialect.name == "sqlite":
+        return
+    connections = await asyncio.gather(*(engine.connect() for _ in range(size)), return_exceptions=True)
+    await asyncio.gather(*(conn.close() for conn in connections if not isinstance(conn, BaseException)))
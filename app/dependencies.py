@@ -0,0 +1,132 @@
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, NamedTuple, Optional
+from fastapi import Depends, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketException, status
+from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth import SECRET_KEY, ALGORITHM
+from app.config import AUTH_TOKEN_CACHE_SIZE, AUTH_USER_CACHE_SIZE, DB_READ_YOUR_WRITES_SECONDS
+from app.crud import get_user_by_email
+from app.db import get_db, SessionLocal, read_router
+
+class CurrentUser(NamedTuple):
+    id: int
+    email: str
+
+class LRUCache:
+    """Небольшой LRU кэш с ограничением размера"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key):
+        self._entries.pop(key, None)
+
+# sha256(token) -> (email, exp): повторные запросы с тем же токеном не проверяют HMAC заново
+verified_tokens = LRUCache(AUTH_TOKEN_CACHE_SIZE)
+# email -> id: повторные запросы не ходят в таблицу users
+user_ids = LRUCache(AUTH_USER_CACHE_SIZE)
+
+def verify_token(token: str) -> Optional[str]:
+    """Email из токена или None, если токен некорректен или истёк"""
+    digest = hashlib.sha256(token.encode()).digest()
+    cached = verified_tokens.get(digest)
+    if cached is not None:
+        email, expires_at = cached
+        if expires_at > time.time():
+            return email
+        verified_tokens.pop(digest)
+        return None
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    email, expires_at = payload.get("sub"), payload.get("exp")
+    if not email or not expires_at:
+        return None
+    verified_tokens.set(digest, (email, expires_at))
+    return email
+
+async def authenticate(token: str, db: AsyncSession) -> Optional[CurrentUser]:
+    email = verify_token(token)
+    if not email:
+        return None
+
+    user_id = user_ids.get(email)
+    if user_id is None:
+        user = await get_user_by_email(db, email)
+        if not user:
+            return None
+        user_id = user.id
+        user_ids.set(email, user_id)
+    return CurrentUser(user_id, email)
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    return token if scheme.lower() == "bearer" and token else None
+
+# 🔐 Текущий пользователь для REST маршрутов
+async def get_current_user(authorization: str = Header(None), db: AsyncSession = Depends(get_db)) -> CurrentUser:
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Authorization header is missing")
+
+    token = bearer_token(authorization)
+    user = await authenticate(token, db) if token else None
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return user
+
+# Время последней записи клиента: его возвращают записывающие маршруты, клиент присылает его обратно
+LAST_WRITE_COOKIE = "last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+
+def mark_write(response: Response):
+    """Отмечаем запись у клиента: его чтения ближайшие DB_READ_YOUR_WRITES_SECONDS идут в primary на любом воркере"""
+    written_at = f"{time.time():.3f}"
+    response.set_cookie(LAST_WRITE_COOKIE, written_at, max_age=math.ceil(DB_READ_YOUR_WRITES_SECONDS), httponly=True, samesite="lax")
+    response.headers[LAST_WRITE_HEADER] = written_at
+
+def last_write_time(request: Request) -> Optional[float]:
+    """Время последней записи из заголовка X-Last-Write или cookie last_write; мусор — как отсутствие"""
+    value = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        written_at = float(value) if value else None
+    except ValueError:
+        return None
+    return written_at if written_at is not None and math.isfinite(written_at) else None
+
+# 📖 Сессия для читающих маршрутов: реплика, если она есть, не отстала и клиент недавно не писал
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    session_factory = await read_router.session_factory(last_write_time(request))
+    async with session_factory() as session:
+        yield session
+
+# 🔐 Текущий пользователь для WebSocket: токен в ?token= или в заголовке Authorization
+async def get_current_user_ws(websocket: WebSocket, token: str = Query(None)) -> CurrentUser:
+    token = token or bearer_token(websocket.headers.get("authorization"))
+    user = None
+    if token:
+        # Своя короткая сессия: соединение из пула не держится всё время жизни сокета
+        async with SessionLocal() as db:
+            user = await authenticate(token, db)
+    if not user:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid or expired token")
+    return user
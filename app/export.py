@@ -0,0 +1,42 @@
+import csv
+import io
+import zlib
+from typing import AsyncIterator
+import orjson
+from app.config import EXPORT_BATCH_SIZE
+from app.crud import stream_messages_after
+from app.db import SessionLocal
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CSV_COLUMNS = ("id", "sender_id", "timestamp", "text")
+
+def ndjson_chunk(rows) -> bytes:
+    return b"".join(orjson.dumps(row._asdict()) + b"\n" for row in rows)
+
+def csv_chunk(rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows((row.id, row.sender_id, row.timestamp.isoformat(), row.text) for row in rows)
+    return buffer.getvalue().encode()
+
+async def export_chat(chat_id: int, export_format: str, compress: bool = False,
+                      session_factory=SessionLocal) -> AsyncIterator[bytes]:
+    """Поток экспорта: пачка строк с серверного курсора -> байты (-> gzip) -> клиенту.
+
+    Своя сессия живёт ровно столько, сколько идёт отдача, в памяти — одна пачка.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 — формат gzip
+    encode = ndjson_chunk if export_format == "ndjson" else csv_chunk
+
+    def output(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    if export_format == "csv":
+        yield output((",".join(CSV_COLUMNS) + "\r\n").encode())
+    async with session_factory() as db:
+        async for rows in stream_messages_after(db, chat_id, 0, EXPORT_BATCH_SIZE):
+            chunk = output(encode(rows))
+            if chunk:  # gzip может копить вход, пока не наберёт блок
+                yield chunk
+    if compressor:
+        yield compressor.flush()
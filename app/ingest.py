@@ -0,0 +1,77 @@
+import asyncio
+from typing import List, Tuple
+from app.config import INGEST_FLUSH_SIZE, INGEST_FLUSH_INTERVAL_MS
+from app.crud import create_messages_bulk
+from app.db import SessionLocal
+
+class MessageIngestor:
+    """Групповая запись сообщений: копит сообщения со всех соединений и пишет их одной транзакцией"""
+
+    def __init__(self, session_factory, flush_size: int = INGEST_FLUSH_SIZE, flush_interval_ms: float = INGEST_FLUSH_INTERVAL_MS):
+        self.session_factory = session_factory
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._pending: List[Tuple[tuple, asyncio.Future]] = []
+        self._has_pending = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._flusher: asyncio.Task = None
+        self._stopping = False
+
+    async def submit(self, chat_id: int, sender_id: int, text: str, client_id: str = None, attachment_ids=()):
+        """Ставим сообщение в пачку и ждём, пока оно будет записано"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((chat_id, sender_id, text, client_id, attachment_ids), future))
+        self._has_pending.set()
+        if len(self._pending) >= self.flush_size:
+            self._batch_full.set()
+        return await future
+
+    async def _run(self):
+        # Пока идёт запись одной пачки, следующая успевает накопиться
+        while True:
+            await self._has_pending.wait()
+            if not self._stopping:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await self.flush()
+            if self._stopping and not self._pending:
+                return
+
+    async def flush(self):
+        batch, self._pending = self._pending[:self.flush_size], self._pending[self.flush_size:]
+        if len(self._pending) < self.flush_size:
+            self._batch_full.clear()
+        if not self._pending:
+            self._has_pending.clear()
+        if not batch:
+            return
+
+        try:
+            async with self.session_factory() as db:
+                results = await create_messages_bulk(db, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def stop(self):
+        """Дописываем всё, что осталось в очереди, и останавливаем запись"""
+        if self._flusher is None:
+            return
+        self._stopping = True
+        self._has_pending.set()
+        await self._flusher
+        self._flusher = None
+        self._stopping = False
+
+ingestor = MessageIngestor(SessionLocal)
@@ -0,0 +1,83 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from app.config import LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_RATES, LOG_QUEUE_SIZE
+
+logger = logging.getLogger("chat")
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на событие: время, уровень, имя события и его поля"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "event": getattr(record, "event", record.getMessage()),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in getattr(record, "fields", {}).items())
+        return f"{record.levelname} {getattr(record, 'event', record.getMessage())} {fields}".rstrip()
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Кладёт запись в очередь как есть: форматирование и вывод делает фоновый поток.
+    Если писатель не успевает и очередь полна — запись отбрасывается, а не блокирует event loop."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener: logging.handlers.QueueListener = None
+
+def setup_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT):
+    """Подключаем логгер "chat" к очереди с фоновым писателем в stdout"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger.handlers = [DeferredQueueHandler(log_queue)]
+    logger.setLevel(level)
+    logger.propagate = False
+
+def stop_logging():
+    """Дописываем всё, что осталось в очереди, и останавливаем фоновый поток"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        atexit.unregister(_listener.stop)
+        _listener = None
+
+def log_event(level: int, event: str, **fields):
+    """Структурированное событие. Отключённый уровень и отброшенные сэмплированием события почти ничего не стоят."""
+    if not logger.isEnabledFor(level):
+        return
+    rate = LOG_SAMPLE_RATES.get(event)
+    if rate is not None and random.random() >= rate:
+        return
+    logger.log(level, event, extra={"event": event, "fields": fields})
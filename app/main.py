@@ -1,9 +1,19 @@
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import router  # Наши REST и WebSocket маршруты
-from app.db import Base, engine
+from app.db import Base, engine, wait_for_db, prewarm_pool
+from app.config import DB_POOL_PREWARM
+from sqlalchemy.sql import text
+from app.pubsub import broker
+from app.ingest import ingestor
+from app.auth import password_hasher
+from app.log import setup_logging, stop_logging, log_event
+from app.responses import ORJSONResponse
 
-app = FastAPI()
+setup_logging()  # Логи пишет фоновый поток, event loop только кладёт записи в очередь
+
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Разрешаем CORS и WebSocket с любых источников
 app.add_middleware(
@@ -12,17 +22,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor"],  # Курсоры пагинации истории
 )
 
 # Регистрация всех маршрутов из router
 app.include_router(router)
 
+# Ключ advisory-блокировки PostgreSQL на время создания таблиц
+INIT_DB_LOCK_KEY = 7212025
+
 # Автоматическое создание таблиц в базе данных при старте
 async def init_db():
     async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Воркеры стартуют одновременно — создаём таблицы по очереди
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": INIT_DB_LOCK_KEY})
         await conn.run_sync(Base.metadata.create_all)
 
 @app.on_event("startup")
 async def startup_event():
+    await wait_for_db()
     await init_db()
-    print("✅ База данных инициализирована")
+    if DB_POOL_PREWARM:
+        await prewarm_pool()
+    log_event(logging.INFO, "db.ready")
+    await broker.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ingestor.stop()
+    await broker.stop()
+    password_hasher.shutdown()
+    stop_logging()
@@ -0,0 +1,144 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+from sqlalchemy import event
+
+# Метрики обновляются только из потока event loop (и из событий движка в том же потоке),
+# поэтому обходятся без блокировок: обновление — это несколько операций со словарём и списком.
+
+# Границы бакетов гистограмм задержек, в секундах
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+def _format_labels(names: Tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labels):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in self.values.items()]
+
+class Gauge(Metric):
+    """Значение снимается функцией в момент запроса /metrics: на горячем пути ничего не обновляется.
+    Функция возвращает число или словарь {значения меток: число}.
+    kind="counter" — для монотонных счётчиков, которые объект уже ведёт сам (например, попадания в кэш)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable, labelnames: Tuple[str, ...] = (), kind: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        values = self.function()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in values.items()]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.series: Dict[tuple, list] = {}  # метки -> [счётчики по бакетам..., +Inf, сумма]
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames + ("le",), labels + (bound,))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {series[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+registry: List[Metric] = []
+
+def render_metrics() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.header())
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# 🗄️ Запросы к БД по типу выражения
+db_statement_seconds = Histogram("db_statement_seconds", "Время выполнения SQL выражения", ("statement",))
+
+def statement_kind(statement: str) -> str:
+    kind = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+    return kind if kind in ("select", "insert", "update", "delete", "with", "begin", "commit") else "other"
+
+def instrument_engine(engine):
+    """Подписываемся на события движка и замеряем каждое выражение"""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.query_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "query_started", None)
+        if started is not None:
+            db_statement_seconds.observe(time.perf_counter() - started, statement_kind(statement))
+
+# 🔌 WebSocket
+ws_receive_to_persist_seconds = Histogram(
+    "ws_receive_to_persist_seconds", "От получения кадра до записи сообщения в БД"
+)
+ws_receive_to_deliver_seconds = Histogram(
+    "ws_receive_to_deliver_seconds", "От получения кадра до постановки сообщения в очереди получателей"
+)
+ws_fanout_size = Histogram("ws_fanout_size", "Число локальных соединений, получивших одну рассылку", buckets=SIZE_BUCKETS)
+ws_send_queue_depth = Histogram(
+    "ws_send_queue_depth", "Длина очереди соединения после постановки сообщения", buckets=SIZE_BUCKETS
+)
+ws_slow_consumer_total = Counter(
+    "ws_slow_consumer_total", "Переполнения очереди соединения по применённой политике", ("policy",)
+)
+ws_ephemeral_events_total = Counter(
+    "ws_ephemeral_events_total", "Эфемерные события: разосланные и поглощённые более поздним (coalesced)", ("type", "outcome")
+)
+ws_ephemeral_dropped_total = Counter(
+    "ws_ephemeral_dropped_total", "Эфемерные кадры, не поставленные в занятую или догружающую очередь соединения", ("type",)
+)
+
+# 🔐 bcrypt
+password_hash_seconds = Histogram("password_hash_seconds", "Время bcrypt в пуле", ("operation",))
+password_hash_wait_seconds = Histogram("password_hash_wait_seconds", "Ожидание свободного места в пуле bcrypt", ("operation",))
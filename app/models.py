@@ -1,4 +1,4 @@
-from sqlalchemy import UniqueConstraint, Table, Column, Integer, String, ForeignKey, Boolean, Text, DateTime, func
+from sqlalchemy import DDL, event, Index, UniqueConstraint, Table, Column, BigInteger, Integer, String, ForeignKey, Boolean, Text, DateTime, func
 from sqlalchemy.orm import relationship
 from app.db import Base
 
@@ -17,7 +17,18 @@ chat_members = Table(
     Base.metadata,
     Column("chat_id", Integer, ForeignKey("chats.id", ondelete="CASCADE"), primary_key=True),
     Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
-    Column("role", String, default="member")  # ✅ Добавляем поддержку ролей
+    Column("role", String, default="member"),  # ✅ Добавляем поддержку ролей
+    Column("last_read_message_id", Integer, nullable=True),  # Водяной знак: всё до этого id прочитано
+    Index("ix_chat_members_user_id", "user_id"),  # Список чатов пользователя
+)
+
+# Вложения сообщений: одно сообщение может ссылаться на несколько загруженных файлов
+message_attachments = Table(
+    "message_attachments",
+    Base.metadata,
+    Column("message_id", Integer, ForeignKey("messages.id", ondelete="CASCADE"), primary_key=True),
+    Column("attachment_id", Integer, ForeignKey("attachments.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_message_attachments_attachment_id", "attachment_id"),  # Проверка доступа при скачивании
 )
 
 class User(Base):
@@ -34,6 +45,10 @@ class Chat(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String, nullable=True)
     chat_type = Column(String, nullable=False)  # "private" или "group"
+    # Последнее сообщение чата для списка чатов; use_alter — messages тоже ссылается на chats
+    last_message_id = Column(
+        Integer, ForeignKey("messages.id", ondelete="SET NULL", use_alter=True, name="fk_chats_last_message_id"), nullable=True
+    )
 
     members = relationship("User", secondary=chat_members, back_populates="chats")
 
@@ -45,7 +60,53 @@ class Message(Base):
     text = Column(Text, nullable=False)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     read = Column(Boolean, default=False)
+    read_count = Column(Integer, nullable=False, default=0, server_default="0")  # Сколько участников прочитали
+    # Ключ идемпотентности: id сообщения от клиента или хэш текста в окне дедупликации
+    dedup_key = Column(String(64), nullable=False)
 
     __table_args__ = (
-        UniqueConstraint("chat_id", "sender_id", "text", "timestamp", name="unique_message"),
-    )
\ No newline at end of file
+        UniqueConstraint("chat_id", "sender_id", "dedup_key", name="unique_message_dedup"),
+        # Покрывает keyset-пагинацию истории: WHERE chat_id = ? AND (timestamp, id) < (?, ?)
+        Index("ix_messages_chat_timestamp_id", "chat_id", "timestamp", "id"),
+        # Догрузка при переподключении: WHERE chat_id = ? AND id > ? ORDER BY id
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+    )
+
+class Attachment(Base):
+    """Загруженный файл. Содержимое лежит на диске под своим SHA-256, одинаковые файлы хранятся один раз"""
+    __tablename__ = "attachments"
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    sha256 = Column(String(64), nullable=False, index=True)
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String, nullable=False)
+    filename = Column(String, nullable=True)
+    uploader_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# 🔎 Полнотекстовый поиск. Индекс живёт вне ORM-модели: в PostgreSQL — генерируемая колонка
+# tsvector с GIN-индексом, в SQLite — внешняя таблица FTS5, которую синхронизируют триггеры.
+# Конфигурация "simple" без стемминга: в чатах вперемешку русский и английский.
+SEARCH_TEXT_CONFIG = "simple"
+
+for statement in (
+    f"ALTER TABLE messages ADD COLUMN search_vector tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_TEXT_CONFIG}', text)) STORED",
+    "CREATE INDEX ix_messages_search_vector ON messages USING GIN (search_vector)",
+):
+    event.listen(Message.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+for statement in (
+    "CREATE VIRTUAL TABLE messages_fts USING fts5(text, content='messages', content_rowid='id')",
+    """CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER messages_fts_update AFTER UPDATE OF text ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+    END""",
+):
+    event.listen(Message.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Message.__table__, "before_drop", DDL("DROP TABLE IF EXISTS messages_fts").execute_if(dialect="sqlite"))
@@ -0,0 +1,69 @@
+import json
+from app.config import MESSAGE_MAX_BYTES
+
+# Типы кадров WebSocket. message и read пишутся в БД; typing и presence эфемерные —
+# живут только в памяти воркера и никогда не доходят до базы
+MESSAGE = "message"
+READ = "read"
+TYPING = "typing"
+PRESENCE = "presence"
+ERROR = "error"  # Только результат разбора: некорректный кадр, клиенту уходит текст ошибки
+
+def is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)  # bool — подкласс int: true не должно стать 1
+
+def parse_frame(data: str) -> dict:
+    """Разбор входящего кадра WebSocket.
+
+    Обычный текст или JSON {"text": ..., "client_id": ..., "attachments": [id, ...]} — сообщение,
+    JSON {"type": "read", "up_to": id} — прочитано всё до сообщения up_to,
+    JSON {"type": "typing", "typing": true|false} — пользователь печатает или перестал (по умолчанию true).
+    Кадр с неизвестным или некорректным "type", текст длиннее MESSAGE_MAX_BYTES или с NUL — {"type": "error"}:
+    такой кадр не сохраняется как сообщение.
+    """
+    frame = _parse(data)
+    if frame["type"] == MESSAGE:
+        if text_size(frame["text"]) > MESSAGE_MAX_BYTES:
+            return {"type": ERROR, "error": f"⚠️ Сообщение длиннее {MESSAGE_MAX_BYTES} байт"}
+        if "\x00" in frame["text"]:
+            # PostgreSQL не хранит NUL в text: такая строка уронила бы всю пачку записи
+            return {"type": ERROR, "error": "⚠️ Сообщение содержит недопустимый символ NUL"}
+    return frame
+
+def text_size(text: str) -> int:
+    # Размер, который текст займёт в JSON-кадре брокера: экранирование тоже считается
+    return len(json.dumps(text, ensure_ascii=False).encode())
+
+def _parse(data: str) -> dict:
+    if data.startswith("{"):
+        try:
+            frame = json.loads(data)
+        except ValueError:
+            frame = None
+        if isinstance(frame, dict):
+            frame_type = frame.get("type", MESSAGE)
+            if frame_type == TYPING:
+                return {"type": TYPING, "typing": frame.get("typing") is not False}
+            if frame_type == READ:
+                if is_int(frame.get("up_to")):
+                    return {"type": READ, "up_to": frame["up_to"]}
+                return {"type": ERROR, "error": "⚠️ Кадр read требует целый up_to"}
+            if frame_type != MESSAGE:
+                return {"type": ERROR, "error": f"⚠️ Неизвестный тип кадра: {str(frame_type)[:32]}"}
+            if isinstance(frame.get("text"), str):
+                client_id = frame.get("client_id")
+                attachments = frame.get("attachments")
+                attachments = [] if attachments is None else attachments
+                if not isinstance(attachments, list) or not all(is_int(item) for item in attachments):
+                    return {"type": ERROR, "error": "⚠️ attachments — список id вложений"}
+                return {"type": MESSAGE, "text": frame["text"], "client_id": str(client_id) if client_id is not None else None,
+                        "attachments": tuple(dict.fromkeys(attachments))}
+            if "type" in frame:
+                return {"type": ERROR, "error": "⚠️ Кадр message требует строку text"}
+    return {"type": MESSAGE, "text": data, "client_id": None, "attachments": ()}
+
+def typing_frame(chat_id: int, user_id: int, typing: bool) -> str:
+    return json.dumps({"type": TYPING, "chat_id": chat_id, "user_id": user_id, "typing": typing})
+
+def presence_frame(chat_id: int, user_id: int, online: bool) -> str:
+    return json.dumps({"type": PRESENCE, "chat_id": chat_id, "user_id": user_id, "online": online})
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List
+from sqlalchemy.sql import text
+from app.config import PUBSUB_BACKEND, DB_CONNECT_BACKOFF_MAX
+from app.log import log_event
+
+Handler = Callable[[dict], Awaitable[None]]
+
+# Лимит PostgreSQL на размер payload в NOTIFY
+PG_NOTIFY_MAX_PAYLOAD = 7999
+
+
+class Broker(ABC):
+    """Базовый pub/sub брокер: доставляет события всем подписчикам канала во всех воркерах"""
+
+    def __init__(self):
+        self.handlers: Dict[str, List[Handler]] = {}
+
+    def subscribe(self, channel: str, handler: Handler):
+        """Регистрируем обработчик канала (до вызова start)"""
+        self.handlers.setdefault(channel, []).append(handler)
+
+    async def dispatch(self, channel: str, payload: dict):
+        for handler in self.handlers.get(channel, []):
+            await handler(payload)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, channel: str, payload: dict):
+        """Отправляем событие подписчикам канала"""
+
+
+class InMemoryBroker(Broker):
+    """Брокер внутри одного процесса: все подписчики получают событие сразу"""
+
+    async def publish(self, channel: str, payload: dict):
+        await self.dispatch(channel, payload)
+
+
+class PostgresBroker(Broker):
+    """Брокер поверх PostgreSQL LISTEN/NOTIFY через существующий asyncpg engine.
+
+    Если соединение LISTEN обрывается (рестарт или failover базы), оно переоткрывается
+    с экспоненциальной паузой до backoff_max. События, отправленные за время обрыва, теряются:
+    клиенты догружают их из БД при переподключении (?last_seen=).
+    """
+
+    def __init__(self, engine, backoff_max: float = DB_CONNECT_BACKOFF_MAX):
+        super().__init__()
+        self.engine = engine
+        self.backoff_max = backoff_max
+        self._conn = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._lost = asyncio.Event()
+        self._dispatcher = None
+        self._watchdog = None
+
+    async def start(self):
+        await self._listen()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        self._watchdog = asyncio.create_task(self._reconnect_loop())
+
+    async def stop(self):
+        for task in (self._watchdog, self._dispatcher):
+            if task:
+                task.cancel()
+        self._watchdog = self._dispatcher = None
+        if self._conn:
+            # close() вернул бы соединение в пул с действующими LISTEN — его получил бы обычный запрос
+            await self._conn.invalidate()
+            self._conn = None
+
+    async def _listen(self):
+        # Отдельное долгоживущее соединение только для LISTEN
+        conn = await self.engine.connect()
+        try:
+            raw = await conn.get_raw_connection()
+            driver = raw.driver_connection
+            for channel in self.handlers:
+                await driver.add_listener(channel, self._on_notify)
+        except BaseException:
+            await conn.invalidate()
+            raise
+        self._lost.clear()
+        driver.add_termination_listener(lambda connection: self._lost.set())
+        self._conn = conn
+
+    async def _reconnect_loop(self):
+        while True:
+            await self._lost.wait()
+            log_event(logging.WARNING, "pubsub.listen_lost")
+            try:
+                await self._conn.invalidate()  # Соединение мёртвое: в пул его не возвращаем
+            except Exception:
+                pass
+            self._conn = None
+            delay = 0.1
+            while True:
+                try:
+                    await self._listen()
+                    break
+                except Exception as e:
+                    log_event(logging.WARNING, "pubsub.reconnect_failed", error=repr(e), retry_in=round(delay, 1))
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.backoff_max)
+            log_event(logging.INFO, "pubsub.listen_restored")
+
+    def _on_notify(self, connection, pid, channel, payload):
+        # Колбэк asyncpg синхронный: складываем в очередь, чтобы сохранить порядок доставки
+        self._queue.put_nowait((channel, json.loads(payload)))
+
+    async def _dispatch_loop(self):
+        while True:
+            channel, payload = await self._queue.get()
+            for handler in self.handlers.get(channel, []):
+                try:
+                    await handler(payload)
+                except Exception as e:
+                    # Ошибка одного обработчика не должна останавливать доставку всех следующих событий
+                    log_event(logging.ERROR, "pubsub.handler_failed", channel=channel, error=repr(e))
+
+    async def publish(self, channel: str, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False)
+        if len(data.encode()) > PG_NOTIFY_MAX_PAYLOAD:
+            raise ValueError("Слишком большое сообщение для NOTIFY")
+        # NOTIFY доставляется всем слушателям, включая текущий воркер
+        async with self.engine.begin() as conn:
+            await conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": data})
+
+
+def create_broker(backend: str) -> Broker:
+    """Создание брокера по имени бэкенда из настроек"""
+    if backend == "postgres":
+        from app.db import engine
+        return PostgresBroker(engine)
+    if backend == "memory":
+        return InMemoryBroker()
+    raise ValueError(f"Неизвестный PUBSUB_BACKEND: {backend}")
+
+# Общий брокер процесса: через него работают ConnectionManager и инвалидация кэшей
+broker = create_broker(PUBSUB_BACKEND)
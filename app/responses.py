@@ -0,0 +1,11 @@
+import orjson
+from fastapi.responses import JSONResponse
+
+class ORJSONResponse(JSONResponse):
+    """JSON через orjson: datetime, UUID и dataclass сериализуются в C без jsonable_encoder.
+
+    Маршрут, который сам возвращает ORJSONResponse(dicts), пропускает и обход полей в FastAPI.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
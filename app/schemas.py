@@ -1,5 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import List, Optional
+from app.config import CHAT_MEMBERS_BULK_MAX
 
 # ✅ Модель для создания пользователя
 class UserCreate(BaseModel):
@@ -13,6 +15,13 @@ class MessageCreate(BaseModel):
     sender_id: int
     text: str
 
+# 📎 Модель вложения в ответе истории
+class AttachmentResponse(BaseModel):
+    id: int
+    filename: Optional[str] = None
+    size: int
+    content_type: str
+
 # ✅ Модель ответа для сообщений
 class MessageResponse(BaseModel):
     id: int
@@ -21,6 +30,8 @@ class MessageResponse(BaseModel):
     text: str
     timestamp: datetime
     read: bool
+    read_count: int
+    attachments: List[AttachmentResponse] = []
 
     class Config:
         from_attributes = True
@@ -29,3 +40,7 @@ class MessageResponse(BaseModel):
 class ChatCreate(BaseModel):
     name: str
     chat_type: str  # "private" или "group"
+
+# ✅ Модель для массового добавления участников в чат
+class ChatMembersBulk(BaseModel):
+    user_ids: List[int] = Field(..., min_length=1, max_length=CHAT_MEMBERS_BULK_MAX)
@@ -1,40 +1,275 @@
-from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List
+import asyncio
+from fastapi import WebSocket
+from typing import Dict, List, Optional, Set, Tuple
+from app.config import WS_SEND_QUEUE_SIZE, WS_SLOW_CONSUMER_POLICY, WS_RESUME_MAX_MESSAGES, WS_EPHEMERAL_INTERVAL_MS
+from app.pubsub import Broker, broker
+from app.metrics import (
+    Gauge, ws_fanout_size, ws_send_queue_depth, ws_slow_consumer_total, ws_ephemeral_events_total, ws_ephemeral_dropped_total,
+)
+from app.protocol import PRESENCE, TYPING, presence_frame, typing_frame
+
+# Каналы брокера: персональные сообщения пользователям и рассылка по комнатам чатов
+MESSAGES_CHANNEL = "chat_messages"
+ROOMS_CHANNEL = "chat_rooms"
+
+# Политики для медленных клиентов, у которых переполнилась очередь
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+class Connection:
+    """WebSocket соединение с ограниченной очередью исходящих сообщений и своим writer-таском"""
+
+    def __init__(self, websocket: WebSocket, user_id: int, chat_id: Optional[int], queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: asyncio.Task = None
+        # Пока идёт догрузка пропущенного, живые сообщения откладываются, а не отправляются
+        self.replaying = False
+        self.held: List[tuple] = []  # (message_id, message)
+        self.replayed_ids: Set[int] = set()  # id уже отправленных догрузкой, чтобы не продублировать
+
+    async def close(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # Соединение уже закрыто
+
+class EphemeralSlot:
+    """Состояние ограничителя эфемерных событий одного (пользователь, чат, тип)"""
 
-class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}  # Поддержка нескольких устройств
+        self.sent_at = float("-inf")
+        self.pending: Optional[str] = None  # Последнее событие, ждущее конца интервала
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+class ConnectionManager:
+    def __init__(self, broker: Broker, queue_size: int = WS_SEND_QUEUE_SIZE, policy: str = WS_SLOW_CONSUMER_POLICY,
+                 ephemeral_interval_ms: float = WS_EPHEMERAL_INTERVAL_MS):
+        if policy not in (DROP_OLDEST, DISCONNECT):
+            raise ValueError(f"Неизвестная политика для медленных клиентов: {policy}")
+        self.active_connections: Dict[int, List[Connection]] = {}  # Поддержка нескольких устройств
+        self.rooms: Dict[int, Set[Connection]] = {}  # chat_id -> соединения, открытые в этом чате
+        self.queue_size = queue_size
+        self.policy = policy
+        self.broker = broker
+        self.ephemeral_interval = ephemeral_interval_ms / 1000
+        self._ephemeral: Dict[Tuple[int, int, str], EphemeralSlot] = {}
+        self.broker.subscribe(MESSAGES_CHANNEL, self._on_broker_message)
+        self.broker.subscribe(ROOMS_CHANNEL, self._on_room_message)
 
-    async def connect(self, websocket: WebSocket, user_id: int):
-        """Добавляем WebSocket соединение для пользователя"""
+    async def connect(self, websocket: WebSocket, user_id: int, chat_id: int = None, replay: bool = False) -> Connection:
+        """Добавляем WebSocket соединение для пользователя (и в комнату чата) и запускаем его writer.
+
+        replay=True — клиент догружает пропущенное: живые сообщения копятся до finish_replay.
+        """
         await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
+        connection = Connection(websocket, user_id, chat_id, self.queue_size)
+        connection.replaying = replay
+        connection.writer = asyncio.create_task(self._writer(user_id, connection))
+        self.active_connections.setdefault(user_id, []).append(connection)
+        if chat_id is not None:
+            self.rooms.setdefault(chat_id, set()).add(connection)
+        return connection
 
     def disconnect(self, user_id: int, websocket: WebSocket):
-        """Отключаем WebSocket соединение для пользователя"""
-        if user_id in self.active_connections:
-            self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:  # Если список пуст, удаляем user_id
-                del self.active_connections[user_id]
+        """Отключаем WebSocket соединение для пользователя (повторный вызов безопасен)"""
+        connections = self.active_connections.get(user_id, [])
+        for connection in connections:
+            if connection.websocket is websocket:
+                connections.remove(connection)
+                connection.writer.cancel()
+                self._leave_room(connection)
+                break
+        if not connections:  # Если список пуст, удаляем user_id
+            self.active_connections.pop(user_id, None)
+
+    def _leave_room(self, connection: Connection):
+        room = self.rooms.get(connection.chat_id)
+        if room is not None:
+            room.discard(connection)
+            if not room:
+                del self.rooms[connection.chat_id]
+
+    async def _writer(self, user_id: int, connection: Connection):
+        """Отправляем сообщения из очереди соединения по одному"""
+        try:
+            while True:
+                message = await connection.queue.get()
+                await connection.websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Любая ошибка отправки означает мёртвый сокет
+            self.disconnect(user_id, connection.websocket)
 
     async def send_message(self, user_id: int, message: str):
-        """Отправляем сообщение на все устройства пользователя"""
-        if user_id in self.active_connections:
-            for websocket in self.active_connections[user_id]:
-                try:
-                    await websocket.send_text(message)
-                except WebSocketDisconnect:
-                    self.disconnect(user_id, websocket)
-
-    async def mark_as_read(self, user_id: int, message_id: int):
-        """Уведомляем пользователя о прочитанном сообщении"""
-        if user_id in self.active_connections:
-            for websocket in self.active_connections[user_id]:
-                try:
-                    await websocket.send_text(f"✅ Ваше сообщение {message_id} прочитано!")
-                except WebSocketDisconnect:
-                    self.disconnect(user_id, websocket)
-
-manager = ConnectionManager()
+        """Публикуем сообщение через брокер: каждый воркер доставит его своим соединениям"""
+        await self.send_many([user_id], message)
+
+    async def send_many(self, user_ids: List[int], message: str):
+        """Публикуем одно сообщение сразу нескольким пользователям"""
+        await self.broker.publish(MESSAGES_CHANNEL, {"user_ids": user_ids, "message": message})
+
+    async def _on_broker_message(self, payload: dict):
+        for user_id in payload["user_ids"]:
+            self.send_local(user_id, payload["message"])
+
+    async def broadcast(self, chat_id: int, message: str, exclude_user: int = None, message_id: int = None):
+        """Рассылаем сообщение всем, кто сейчас онлайн в комнате чата (кроме exclude_user)"""
+        await self.broker.publish(
+            ROOMS_CHANNEL, {"chat_id": chat_id, "message": message, "exclude_user": exclude_user, "message_id": message_id}
+        )
+
+    async def _on_room_message(self, payload: dict):
+        # Кадр уже сериализован: одна и та же строка попадает в очереди всех получателей
+        message, exclude_user, message_id = payload["message"], payload["exclude_user"], payload.get("message_id")
+        delivered = 0
+        for connection in list(self.rooms.get(payload["chat_id"], ())):
+            if connection.user_id != exclude_user and message_id not in connection.replayed_ids:
+                self._enqueue(connection.user_id, connection, message, message_id)
+                delivered += 1
+        ws_fanout_size.observe(delivered)
+
+    def send_to_connection(self, connection: Connection, message: str):
+        """Ответ конкретному соединению (без брокера — оно на этом воркере)"""
+        self._enqueue(connection.user_id, connection, message)
+
+    def send_local(self, user_id: int, message: str):
+        """Ставим сообщение в очереди всех устройств пользователя на этом воркере, не дожидаясь сети"""
+        for connection in list(self.active_connections.get(user_id, [])):
+            self._enqueue(user_id, connection, message)
+
+    async def send_replay(self, connection: Connection, message: str, message_ids: List[int]) -> bool:
+        """Кадр догрузки: ждём места в очереди вместо вытеснения, чтобы история дошла целиком.
+
+        False — соединение закрылось раньше, чем кадр встал в очередь.
+        """
+        connection.replayed_ids.update(message_ids)
+        put = asyncio.ensure_future(connection.queue.put(message))
+        await asyncio.wait({put, connection.writer}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            return False
+        return True
+
+    def finish_replay(self, connection: Connection, keep_ids: List[int]):
+        """Догрузка закончена: отправляем отложенные живые сообщения, которых не было в догрузке.
+
+        keep_ids — id последней пачки: только их рассылка ещё может прийти с опозданием.
+        """
+        held, connection.held = connection.held, []
+        replayed, connection.replayed_ids = connection.replayed_ids, set(keep_ids)
+        connection.replaying = False
+        for message_id, message in held:
+            if message_id not in replayed:
+                self._enqueue(connection.user_id, connection, message, message_id)
+
+    def _enqueue(self, user_id: int, connection: Connection, message: str, message_id: int = None):
+        if connection.replaying:
+            if len(connection.held) >= WS_RESUME_MAX_MESSAGES:
+                # Догрузка не поспевает за чатом — клиент переподключится со своим last_seen и ничего не потеряет
+                self.disconnect(user_id, connection.websocket)
+                asyncio.create_task(connection.close(code=1013))
+                return
+            connection.held.append((message_id, message))
+            return
+        if connection.queue.full():
+            ws_slow_consumer_total.inc(1, self.policy)
+            if self.policy == DISCONNECT:
+                # Клиент не успевает читать — закрываем соединение (1013: try again later)
+                self.disconnect(user_id, connection.websocket)
+                asyncio.create_task(connection.close(code=1013))
+                return
+            connection.queue.get_nowait()  # DROP_OLDEST: выбрасываем самое старое сообщение
+        connection.queue.put_nowait(message)
+        ws_send_queue_depth.observe(connection.queue.qsize())
+
+    def publish_ephemeral(self, chat_id: int, user_id: int, event_type: str, message: str):
+        """Эфемерное событие комнате чата на этом воркере: без брокера и без БД.
+
+        На (пользователь, чат, тип) уходит не больше одного события за ephemeral_interval. События внутри
+        интервала сливаются: в его конце отправляется только последнее, поэтому "перестал печатать" не теряется.
+        """
+        key = (user_id, chat_id, event_type)
+        loop = asyncio.get_running_loop()
+        slot = self._ephemeral.get(key)
+        if slot is None:
+            if len(self._ephemeral) >= 10000:
+                self._prune_ephemeral(loop.time())
+            slot = self._ephemeral[key] = EphemeralSlot()
+
+        if slot.timer is None and loop.time() - slot.sent_at >= self.ephemeral_interval:
+            slot.sent_at = loop.time()
+            self._deliver_ephemeral(chat_id, user_id, event_type, message)
+            return
+        if slot.pending is not None:
+            ws_ephemeral_events_total.inc(1, event_type, "coalesced")
+        slot.pending = message
+        if slot.timer is None:
+            slot.timer = loop.call_at(slot.sent_at + self.ephemeral_interval, self._flush_ephemeral, key)
+
+    def _flush_ephemeral(self, key: Tuple[int, int, str]):
+        slot = self._ephemeral.get(key)
+        if slot is None:
+            return
+        slot.timer = None
+        if slot.pending is not None:
+            user_id, chat_id, event_type = key
+            message, slot.pending = slot.pending, None
+            slot.sent_at = asyncio.get_running_loop().time()
+            self._deliver_ephemeral(chat_id, user_id, event_type, message)
+
+    def _prune_ephemeral(self, now: float):
+        """Забываем ограничители, у которых интервал давно истёк и ничего не ждёт отправки"""
+        for key, slot in list(self._ephemeral.items()):
+            if slot.timer is None and now - slot.sent_at >= self.ephemeral_interval:
+                del self._ephemeral[key]
+
+    def _deliver_ephemeral(self, chat_id: int, user_id: int, event_type: str, message: str):
+        ws_ephemeral_events_total.inc(1, event_type, "sent")
+        for connection in list(self.rooms.get(chat_id, ())):
+            if connection.user_id == user_id:
+                continue
+            # Эфемерный кадр не стоит ни вытеснения сообщений, ни отключения медленного клиента
+            if connection.replaying or connection.queue.full():
+                ws_ephemeral_dropped_total.inc(1, event_type)
+                continue
+            connection.queue.put_nowait(message)
+
+    def _has_other_device(self, connection: Connection) -> bool:
+        room = self.rooms.get(connection.chat_id, ())
+        return any(other is not connection and other.user_id == connection.user_id for other in room)
+
+    def announce_presence(self, connection: Connection, online: bool):
+        """Онлайн/офлайн пользователя для комнаты: только при первом входе и последнем выходе из чата"""
+        if self._has_other_device(connection):
+            return  # Другое устройство пользователя всё ещё в чате
+        self.publish_ephemeral(
+            connection.chat_id, connection.user_id, PRESENCE, presence_frame(connection.chat_id, connection.user_id, online)
+        )
+
+    def end_typing(self, connection: Connection):
+        """Последнее соединение пользователя с чатом закрылось: отложенный кадр набора не отправляем.
+
+        Если пользователь сообщал о наборе, комната сразу получает typing: false — иначе у остальных
+        он так и остался бы "печатающим".
+        """
+        if self._has_other_device(connection):
+            return
+        slot = self._ephemeral.pop((connection.user_id, connection.chat_id, TYPING), None)
+        if slot is None:
+            return
+        if slot.timer is not None:
+            slot.timer.cancel()
+        self._deliver_ephemeral(
+            connection.chat_id, connection.user_id, TYPING, typing_frame(connection.chat_id, connection.user_id, False)
+        )
+
+manager = ConnectionManager(broker)
+
+Gauge("ws_active_connections", "Открытые WebSocket соединения на этом воркере",
+      lambda: sum(len(connections) for connections in manager.active_connections.values()))
+Gauge("ws_active_users", "Пользователи, подключённые к этому воркеру", lambda: len(manager.active_connections))
+Gauge("ws_active_rooms", "Чаты, в которых есть хотя бы одно соединение", lambda: len(manager.rooms))
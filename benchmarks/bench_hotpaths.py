@@ -0,0 +1,275 @@
+"""Микробенчмарки горячих путей: crud, JWT, рассылка ConnectionManager и маршруты через ASGITransport.
+
+Всё выполняется в одном процессе, без запущенного сервера и без .env.test: по умолчанию база —
+SQLite во временном файле, для замера на PostgreSQL задайте DATABASE_URL (таблицы создаются,
+если их нет, данные бенчмарка пишутся под уникальными email). Замер — медиана и p95 одного вызова.
+
+    python -m benchmarks.bench_hotpaths --save benchmarks/baselines/local.json
+    python -m benchmarks.bench_hotpaths --compare benchmarks/baselines/local.json --threshold 0.2
+
+С --compare процесс завершается с кодом 1, если медиана хотя бы одного замера выросла больше
+чем на threshold относительно эталона. Эталон сравнивайте только с прогонами на той же машине и той же СУБД.
+"""
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db")
+
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+import uuid
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert, select
+
+from app.auth import create_access_token
+from app.cache import membership_cache
+from app.crud import create_message, get_chat_members, get_messages, mark_message_as_read
+from app.db import SessionLocal
+from app.dependencies import verify_token
+from app.main import app, init_db
+from app.models import Chat, Message, User, chat_members
+from app.pubsub import InMemoryBroker
+from app.websocket import ConnectionManager
+
+CASES = {}
+
+def case(name: str):
+    """Регистрирует замер: корутина принимает Context и выполняет ровно одну операцию"""
+    def register(func):
+        CASES[name] = func
+        return func
+    return register
+
+class FakeWebSocket:
+    """Сокет без сети: считает доставленные кадры и будит бенчмарк, когда дошло всё"""
+
+    def __init__(self, fanout: "Fanout"):
+        self.fanout = fanout
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        self.fanout.delivered += 1
+        if self.fanout.delivered == self.fanout.expected:
+            self.fanout.done.set()
+
+    async def close(self, code: int):
+        pass
+
+class Fanout:
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.delivered = 0
+        self.done = asyncio.Event()
+
+    def reset(self):
+        self.delivered = 0
+        self.done.clear()
+
+class Context:
+    """Данные, созданные seed(): чат, участники, сообщения, токены, менеджер соединений"""
+
+    def __init__(self, args):
+        self.args = args
+        self.run_id = uuid.uuid4().hex[:8]
+        self.counter = itertools.count()
+        self.chat_id = None
+        self.user_ids = []
+        self.message_ids = []
+        self.tokens = {}
+        self.read_pairs = None  # (сообщение, читатель): каждая отметка о прочтении — новая
+        self.client = None
+        self.manager = None
+        self.fanout = None
+
+async def seed(ctx: Context):
+    args = ctx.args
+    await init_db()
+    async with SessionLocal() as db:
+        await db.execute(insert(User), [
+            {"name": f"Bench {i}", "email": f"bench-{ctx.run_id}-{i}@example.com", "password": "x"}
+            for i in range(args.members)
+        ])
+        ctx.user_ids = list((await db.execute(
+            select(User.id).where(User.email.like(f"bench-{ctx.run_id}-%")).order_by(User.id)
+        )).scalars())
+        ctx.chat_id = (await db.execute(insert(Chat).values(name=f"bench-{ctx.run_id}", chat_type="group").returning(Chat.id))).scalar()
+        await db.execute(insert(chat_members), [{"chat_id": ctx.chat_id, "user_id": user_id} for user_id in ctx.user_ids])
+        await db.execute(insert(Message), [
+            {"chat_id": ctx.chat_id, "sender_id": ctx.user_ids[0], "text": f"Сообщение номер {i}",
+             "read": False, "read_count": 0, "dedup_key": f"bench:{i}"}
+            for i in range(args.messages)
+        ])
+        ctx.message_ids = list((await db.execute(
+            select(Message.id).where(Message.chat_id == ctx.chat_id).order_by(Message.id)
+        )).scalars())
+        await db.commit()
+
+    readers = ctx.user_ids[1:]
+    ctx.read_pairs = itertools.product(ctx.message_ids, readers)
+    for i, user_id in enumerate(ctx.user_ids):
+        ctx.tokens[user_id] = create_access_token({"sub": f"bench-{ctx.run_id}-{i}@example.com"})
+    ctx.client = AsyncClient(transport=ASGITransport(app=app), base_url="http://bench")
+
+    # Отдельный менеджер на брокере в памяти: замеряется постановка в очереди и writer-таски, без NOTIFY
+    ctx.manager = ConnectionManager(InMemoryBroker(), queue_size=args.iterations + args.warmup + 1)
+    ctx.fanout = Fanout(args.fanout)
+    for user_id in range(1, args.fanout + 1):
+        await ctx.manager.connect(FakeWebSocket(ctx.fanout), user_id, chat_id=1)
+
+@case("crud.create_message")
+async def bench_create_message(ctx: Context):
+    async with SessionLocal() as db:
+        await create_message(db, ctx.chat_id, ctx.user_ids[0], f"bench {ctx.run_id} {next(ctx.counter)}")
+
+@case("crud.get_messages")
+async def bench_get_messages(ctx: Context):
+    async with SessionLocal() as db:
+        await get_messages(db, ctx.chat_id, 50)
+
+@case("crud.mark_message_as_read")
+async def bench_mark_message_as_read(ctx: Context):
+    message_id, user_id = next(ctx.read_pairs)
+    async with SessionLocal() as db:
+        await mark_message_as_read(db, message_id, user_id)
+
+@case("crud.get_chat_members.uncached")
+async def bench_get_chat_members_uncached(ctx: Context):
+    membership_cache.invalidate_local(ctx.chat_id)
+    async with SessionLocal() as db:
+        await get_chat_members(db, ctx.chat_id)
+
+@case("crud.get_chat_members.cached")
+async def bench_get_chat_members_cached(ctx: Context):
+    async with SessionLocal() as db:
+        await get_chat_members(db, ctx.chat_id)
+
+@case("auth.create_access_token")
+async def bench_create_access_token(ctx: Context):
+    create_access_token({"sub": f"bench-{next(ctx.counter)}@example.com"})
+
+@case("auth.verify_token")
+async def bench_verify_token(ctx: Context):
+    # Каждый раз новый токен: замеряется проверка подписи, а не кэш verified_tokens
+    token = create_access_token({"sub": f"bench-{next(ctx.counter)}@example.com"})
+    assert verify_token(token)
+
+@case("ws.send_many")
+async def bench_send_many(ctx: Context):
+    ctx.fanout.reset()
+    await ctx.manager.send_many(list(range(1, ctx.args.fanout + 1)), "📩 Новое сообщение")
+    await ctx.fanout.done.wait()
+
+@case("ws.broadcast")
+async def bench_broadcast(ctx: Context):
+    ctx.fanout.reset()
+    await ctx.manager.broadcast(1, "📩 Новое сообщение", message_id=next(ctx.counter))
+    await ctx.fanout.done.wait()
+
+@case("http.history")
+async def bench_http_history(ctx: Context):
+    response = await ctx.client.get(f"/history/{ctx.chat_id}", params={"limit": 50})
+    response.raise_for_status()
+
+@case("http.chat_members")
+async def bench_http_chat_members(ctx: Context):
+    response = await ctx.client.get(f"/chats/{ctx.chat_id}/members")
+    response.raise_for_status()
+
+@case("http.mark_read")
+async def bench_http_mark_read(ctx: Context):
+    message_id, user_id = next(ctx.read_pairs)
+    response = await ctx.client.put(f"/message/read/{message_id}", headers={"Authorization": f"Bearer {ctx.tokens[user_id]}"})
+    response.raise_for_status()
+
+async def measure(func, ctx: Context) -> dict:
+    for _ in range(ctx.args.warmup):
+        await func(ctx)  # Прогрев: кэш компиляции запросов, пул соединений, кэш id пользователей
+    samples = []
+    for _ in range(ctx.args.iterations):
+        started = time.perf_counter_ns()
+        await func(ctx)
+        samples.append((time.perf_counter_ns() - started) / 1000)
+    samples.sort()
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))], 1)
+    return {
+        "iterations": len(samples),
+        "p50_us": pick(0.50),
+        "p95_us": pick(0.95),
+        "mean_us": round(sum(samples) / len(samples), 1),
+        "ops_per_second": round(len(samples) / (sum(samples) / 1e6), 1),
+    }
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Строки отчёта по замерам, присутствующим в обоих прогонах; regression=True — медиана выросла больше threshold"""
+    report = []
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["p50_us"], result["p50_us"]
+        change = (after - before) / before if before else 0.0
+        report.append({"case": name, "baseline_p50_us": before, "p50_us": after,
+                       "change": round(change, 3), "regression": change > threshold})
+    return report
+
+async def run(args) -> dict:
+    ctx = Context(args)
+    await seed(ctx)
+    results = {}
+    try:
+        for name, func in CASES.items():
+            if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                continue
+            results[name] = await measure(func, ctx)
+    finally:
+        await ctx.client.aclose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--members", type=int, default=50, help="участников в чате бенчмарка")
+    parser.add_argument("--messages", type=int, default=1000, help="сообщений в чате до начала замеров")
+    parser.add_argument("--fanout", type=int, default=100, help="сокетов, получающих одно сообщение в ws.*")
+    parser.add_argument("--only", nargs="+", help="только замеры с этими префиксами, например crud. ws.broadcast")
+    parser.add_argument("--save", help="сохранить результат как эталон (JSON)")
+    parser.add_argument("--compare", help="сравнить с эталоном (JSON)")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимый рост медианы, 0.2 = +20%%")
+    args = parser.parse_args()
+
+    # Отметок о прочтении нужно по одной на пару (сообщение, читатель)
+    read_cases = sum(name.endswith("mark_message_as_read") or name.endswith("mark_read") for name in CASES)
+    if args.messages * (args.members - 1) < read_cases * (args.iterations + args.warmup):
+        parser.error("--messages * (--members - 1) меньше числа отметок о прочтении; увеличьте --messages")
+
+    results = asyncio.run(run(args))
+    output = {"database": os.environ["DATABASE_URL"].split(":", 1)[0], "results": results}
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as f:
+            f.write(json.dumps(output, indent=2, ensure_ascii=False) + "\n")
+
+    if not args.compare:
+        print(json.dumps(output, indent=2, ensure_ascii=False))
+        return
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    if baseline.get("database") != output["database"]:
+        print(f"⚠️ Эталон снят на {baseline.get('database')}, текущий прогон — на {output['database']}", file=sys.stderr)
+    report = compare(baseline["results"], results, args.threshold)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    regressions = [row["case"] for row in report if row["regression"]]
+    if regressions:
+        print(f"❌ Регрессия больше {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Задержка event loop во время шторма логинов: bcrypt прямо в loop против пула PasswordHasher.
+
+Пока идут одновременные проверки паролей, фоновая корутина каждые TICK_MS просыпается
+и записывает, на сколько опоздала. Ровно такую задержку увидит любой WebSocket кадр этого воркера.
+
+    python -m benchmarks.bench_login_latency --logins 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.auth import PasswordHasher, get_password_hash, verify_password
+
+TICK_MS = 5
+
+async def measure_lag(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        scheduled = time.perf_counter()
+        await asyncio.sleep(TICK_MS / 1000)
+        lags.append((time.perf_counter() - scheduled) * 1000 - TICK_MS)
+
+async def login_inline(hashed: str):
+    verify_password("password123", hashed)  # Старый путь: bcrypt блокирует loop
+
+async def run(mode: str, logins: int, hashed: str, hasher: PasswordHasher) -> dict:
+    lags, stop = [], asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    await asyncio.sleep(TICK_MS / 1000 * 4)
+
+    started = time.perf_counter()
+    if mode == "inline":
+        await asyncio.gather(*[login_inline(hashed) for _ in range(logins)])
+    else:
+        await asyncio.gather(*[hasher.verify("password123", hashed) for _ in range(logins)])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+    lags.sort()
+    return {
+        "mode": mode,
+        "logins": logins,
+        "elapsed_seconds": round(elapsed, 3),
+        "loop_lag_ms_p50": round(statistics.median(lags), 2),
+        "loop_lag_ms_p99": round(lags[int(len(lags) * 0.99) - 1], 2),
+        "loop_lag_ms_max": round(lags[-1], 2),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    hashed = get_password_hash("password123")
+    hasher = PasswordHasher(args.executor, args.workers)
+    results = [await run(mode, args.logins, hashed, hasher) for mode in ("inline", "pool")]
+    hasher.shutdown()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
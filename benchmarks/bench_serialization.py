@@ -0,0 +1,79 @@
+"""Стоимость страницы /history: ORM-объекты + jsonable_encoder против строк-кортежей + orjson.
+
+Старый путь: select(Message) -> объекты Message -> jsonable_encoder -> json.dumps (JSONResponse).
+Новый путь: select(*MESSAGE_COLUMNS) -> строки -> dict -> orjson (ORJSONResponse).
+Запросы идут в SQLite в памяти, поэтому разница — это гидратация ORM и сериализация, а не сеть.
+
+    python -m benchmarks.bench_serialization --pages 200 --limits 10 100 1000
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app.crud import MESSAGE_COLUMNS
+from app.db import Base
+from app.models import Chat, Message, User
+from app.responses import ORJSONResponse
+
+def seed(engine, messages: int):
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"name": "bench", "email": "bench@example.com", "password": "x"}])
+        conn.execute(insert(Chat), [{"name": "bench", "chat_type": "group"}])
+        now = datetime.now(timezone.utc)
+        conn.execute(insert(Message), [
+            {"chat_id": 1, "sender_id": 1, "text": f"Сообщение номер {i} " * 3, "timestamp": now,
+             "read": False, "read_count": 0, "dedup_key": f"c:{i}"}
+            for i in range(messages)
+        ])
+
+def orm_page(session: Session, limit: int) -> bytes:
+    messages = session.execute(select(Message).where(Message.chat_id == 1).limit(limit)).scalars().all()
+    body = JSONResponse(jsonable_encoder(messages)).body
+    session.expunge_all()  # Как у новой сессии на каждый запрос: объекты гидратируются заново
+    return body
+
+def tuple_page(session: Session, limit: int) -> bytes:
+    rows = session.execute(select(*MESSAGE_COLUMNS).where(Message.chat_id == 1).limit(limit)).all()
+    return ORJSONResponse([row._asdict() for row in rows]).body
+
+def measure(func, session: Session, limit: int, pages: int) -> float:
+    func(session, limit)  # Прогрев: компиляция запроса попадает в кэш
+    started = time.perf_counter()
+    for _ in range(pages):
+        func(session, limit)
+    return (time.perf_counter() - started) / pages * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--limits", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    seed(engine, max(args.limits))
+    results = []
+    with Session(engine) as session:
+        for limit in args.limits:
+            orm_ms = measure(orm_page, session, limit, args.pages)
+            tuple_ms = measure(tuple_page, session, limit, args.pages)
+            results.append({
+                "limit": limit,
+                "orm_jsonable_encoder_ms": round(orm_ms, 3),
+                "tuples_orjson_ms": round(tuple_ms, 3),
+                "speedup": round(orm_ms / tuple_ms, 1),
+            })
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Нагрузочный тест WebSocket чата: регистрация, чаты, M сокетов и заданный поток сообщений.
+
+Пользователи и чаты создаются через обычные маршруты API, затем сокеты открываются с заданной
+скоростью и каждый шлёт сообщения с общей интенсивностью --rate сообщений в секунду.
+В текст сообщения вшито время отправки, поэтому задержка доставки считается по каждому
+полученному кадру "📩 Новое сообщение ...", а задержка подтверждения — по "✅ Сообщение ... отправлено!".
+
+    python -m benchmarks.loadtest --users 100 --chat-size 10 --sockets 100 --rate 200 --duration 30
+    python -m benchmarks.loadtest --base-url http://localhost:8000 --output results/v1.json
+
+Результат — JSON с пропускной способностью и p50/p95/p99 задержек в миллисекундах.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import httpx
+import websockets
+
+MARKER = "lt|"
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {"count": 0}
+    samples = sorted(samples)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))], 2)
+    return {"count": len(samples), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(samples[-1], 2)}
+
+class Stats:
+    def __init__(self):
+        self.connect_ms = []
+        self.delivery_ms = []
+        self.ack_ms = []
+        self.sent = 0
+        self.errors = 0
+        self.connect_failures = 0
+        self.disconnects = 0
+
+async def create_user(client: httpx.AsyncClient, run_id: str, index: int, password: str, limit: asyncio.Semaphore) -> dict:
+    email = f"lt-{run_id}-{index}@example.com"
+    async with limit:
+        response = await client.post("/register", json={"name": f"Load {index}", "email": email, "password": password})
+        response.raise_for_status()
+        user_id = response.json()["user_id"]
+        response = await client.post("/token", data={"username": email, "password": password})
+        response.raise_for_status()
+    return {"id": user_id, "token": response.json()["access_token"]}
+
+async def setup(client: httpx.AsyncClient, args, run_id: str) -> list:
+    """Регистрируем пользователей и раскладываем их по чатам по --chat-size человек"""
+    limit = asyncio.Semaphore(args.setup_concurrency)
+    users = await asyncio.gather(*(create_user(client, run_id, i, args.password, limit) for i in range(args.users)))
+
+    for start in range(0, len(users), args.chat_size):
+        group = users[start:start + args.chat_size]
+        response = await client.post("/chats", json={"name": f"load-{run_id}-{start}", "chat_type": "group"})
+        response.raise_for_status()
+        chat_id = response.json()["chat_id"]
+        for user in group:
+            user["chat_id"] = chat_id
+
+        async def join(user):
+            async with limit:
+                (await client.post(f"/chats/{chat_id}/members", params={"user_id": user["id"]})).raise_for_status()
+        await asyncio.gather(*(join(user) for user in group))
+    return users
+
+async def reader(websocket, stats: Stats):
+    async for frame in websocket:
+        received = time.perf_counter_ns()
+        if frame.startswith("⚠️") or frame.startswith("❌"):
+            stats.errors += 1
+            continue
+        if MARKER not in frame:
+            continue  # Уведомления о прочтении и прочие кадры
+        # "...: lt|<сокет>|<номер>|<время отправки>" или "✅ Сообщение 'lt|...|<время>' отправлено!"
+        sent_ns = int(frame.split(MARKER, 1)[1].split("|")[2].split("'")[0])
+        latency_ms = (received - sent_ns) / 1e6
+        if frame.startswith("✅"):
+            stats.ack_ms.append(latency_ms)
+        elif frame.startswith("📩"):
+            stats.delivery_ms.append(latency_ms)
+
+async def run_socket(ws_url: str, user: dict, socket_index: int, args, run_id: str, stats: Stats, deadline: float):
+    url = f"{ws_url}/ws/{user['id']}/{user['chat_id']}?token={user['token']}"
+    started = time.perf_counter()
+    try:
+        websocket = await websockets.connect(url, max_queue=None)
+    except Exception:
+        stats.connect_failures += 1
+        return
+    stats.connect_ms.append((time.perf_counter() - started) * 1000)
+
+    read_task = asyncio.create_task(reader(websocket, stats))
+    interval = args.sockets / args.rate if args.rate > 0 else None
+    next_send = time.perf_counter() + random.uniform(0, interval or 0)  # Разносим сокеты по фазе
+    seq = 0
+    try:
+        while interval and time.perf_counter() < deadline:
+            await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+            next_send += interval
+            seq += 1
+            await websocket.send(f"{MARKER}{run_id}-{socket_index}|{seq}|{time.perf_counter_ns()}")
+            stats.sent += 1
+        await asyncio.sleep(max(0.0, deadline - time.perf_counter()) + args.drain)
+    except websockets.ConnectionClosed:
+        stats.disconnects += 1
+    finally:
+        read_task.cancel()
+        await websocket.close()
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=20, help="сколько пользователей зарегистрировать")
+    parser.add_argument("--chat-size", type=int, default=5, help="участников в одном чате")
+    parser.add_argument("--sockets", type=int, default=None, help="сколько сокетов открыть (по умолчанию по одному на пользователя)")
+    parser.add_argument("--connect-rate", type=float, default=50, help="новых сокетов в секунду")
+    parser.add_argument("--rate", type=float, default=50, help="сообщений в секунду суммарно по всем сокетам")
+    parser.add_argument("--duration", type=float, default=10, help="сколько секунд слать сообщения")
+    parser.add_argument("--drain", type=float, default=2, help="сколько ждать доставки после отправки последних сообщений")
+    parser.add_argument("--setup-concurrency", type=int, default=10)
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--output", help="куда дополнительно сохранить JSON с результатом")
+    args = parser.parse_args()
+    args.sockets = args.sockets or args.users
+
+    run_id = uuid.uuid4().hex[:8]
+    ws_url = args.base_url.replace("http", "ws", 1)
+    stats = Stats()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        setup_started = time.perf_counter()
+        users = await setup(client, args, run_id)
+        setup_seconds = time.perf_counter() - setup_started
+
+    # Все сокеты шлют до одного дедлайна, который отсчитывается после открытия последнего
+    connect_seconds = args.sockets / args.connect_rate
+    deadline = time.perf_counter() + connect_seconds + args.duration
+    tasks = []
+    for i in range(args.sockets):
+        tasks.append(asyncio.create_task(run_socket(ws_url, users[i % len(users)], i, args, run_id, stats, deadline)))
+        await asyncio.sleep(1 / args.connect_rate)
+    await asyncio.gather(*tasks)
+
+    send_window = args.duration + connect_seconds
+    result = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("password", "output")},
+        "setup_seconds": round(setup_seconds, 2),
+        "sockets": {"opened": len(stats.connect_ms), "failed": stats.connect_failures,
+                    "closed_by_server": stats.disconnects, "connect_ms": percentiles(stats.connect_ms)},
+        "messages": {"sent": stats.sent, "acked": len(stats.ack_ms), "errors": stats.errors,
+                     "sent_per_second": round(stats.sent / send_window, 1)},
+        "deliveries": {"received": len(stats.delivery_ms),
+                       "per_second": round(len(stats.delivery_ms) / send_window, 1)},
+        "ack_latency_ms": percentiles(stats.ack_ms),
+        "delivery_latency_ms": percentiles(stats.delivery_ms),
+    }
+    report = json.dumps(result, indent=2, ensure_ascii=False)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+if __name__ == "__main__":
+    asyncio.run(main())
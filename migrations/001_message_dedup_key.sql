@@ -0,0 +1,14 @@
+-- Идемпотентные ключи сообщений вместо уникального индекса по полному тексту.
+-- Запускать через psql вне транзакции (из-за CREATE INDEX CONCURRENTLY):
+--   psql "postgresql://user:password@db/new_chat_db" -f migrations/001_message_dedup_key.sql
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS dedup_key VARCHAR(64);
+
+-- Старым сообщениям даём уникальный ключ, который не пересекается с новыми ("c:..." и "h:...")
+UPDATE messages SET dedup_key = 'legacy:' || id WHERE dedup_key IS NULL;
+ALTER TABLE messages ALTER COLUMN dedup_key SET NOT NULL;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS unique_message_dedup ON messages (chat_id, sender_id, dedup_key);
+ALTER TABLE messages ADD CONSTRAINT unique_message_dedup UNIQUE USING INDEX unique_message_dedup;
+
+ALTER TABLE messages DROP CONSTRAINT IF EXISTS unique_message;
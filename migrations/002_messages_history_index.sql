@@ -0,0 +1,2 @@
+-- Составной индекс для keyset-пагинации истории (/history/{chat_id}?before=...&after=...)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_chat_timestamp_id ON messages (chat_id, timestamp, id);
@@ -0,0 +1,7 @@
+-- Счётчик прочитавших на самом сообщении вместо COUNT(*) по message_readers при каждой отметке
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS read_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE messages m
+SET read_count = r.cnt
+FROM (SELECT message_id, COUNT(*) AS cnt FROM message_readers GROUP BY message_id) r
+WHERE m.id = r.message_id;
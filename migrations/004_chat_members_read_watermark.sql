@@ -0,0 +1,2 @@
+-- Водяной знак прочтения на участнике чата: одна запись на (chat, user) вместо строки на каждое сообщение
+ALTER TABLE chat_members ADD COLUMN IF NOT EXISTS last_read_message_id INTEGER;
@@ -0,0 +1,2 @@
+-- Индекс для догрузки пропущенных сообщений при переподключении WebSocket (?last_seen=...)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_chat_id_id ON messages (chat_id, id);
@@ -0,0 +1,11 @@
+-- Список чатов пользователя (/users/me/chats): последнее сообщение чата.
+-- Непрочитанные считаются при чтении по водяному знаку и индексу (chat_id, id), отдельной колонки нет
+ALTER TABLE chats ADD COLUMN IF NOT EXISTS last_message_id INTEGER;
+
+UPDATE chats c SET last_message_id = (SELECT MAX(m.id) FROM messages m WHERE m.chat_id = c.id);
+
+ALTER TABLE chats DROP CONSTRAINT IF EXISTS fk_chats_last_message_id;
+ALTER TABLE chats ADD CONSTRAINT fk_chats_last_message_id
+    FOREIGN KEY (last_message_id) REFERENCES messages (id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS ix_chat_members_user_id ON chat_members (user_id);
@@ -0,0 +1,5 @@
+-- Полнотекстовый поиск по сообщениям (/chats/{chat_id}/search): генерируемая колонка tsvector и GIN-индекс.
+-- Добавление STORED-колонки переписывает таблицу — выполняйте в окно обслуживания.
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple', text)) STORED;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_search_vector ON messages USING GIN (search_vector);
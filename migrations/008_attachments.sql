@@ -0,0 +1,19 @@
+-- Вложения: файлы на диске под своим SHA-256, в базе — метаданные и связь с сообщениями
+CREATE TABLE IF NOT EXISTS attachments (
+    id SERIAL PRIMARY KEY,
+    sha256 VARCHAR(64) NOT NULL,
+    size BIGINT NOT NULL,
+    content_type VARCHAR NOT NULL,
+    filename VARCHAR,
+    uploader_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS ix_attachments_id ON attachments (id);
+CREATE INDEX IF NOT EXISTS ix_attachments_sha256 ON attachments (sha256);
+
+CREATE TABLE IF NOT EXISTS message_attachments (
+    message_id INTEGER NOT NULL REFERENCES messages (id) ON DELETE CASCADE,
+    attachment_id INTEGER NOT NULL REFERENCES attachments (id) ON DELETE CASCADE,
+    PRIMARY KEY (message_id, attachment_id)
+);
+CREATE INDEX IF NOT EXISTS ix_message_attachments_attachment_id ON message_attachments (attachment_id);
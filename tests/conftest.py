@@ -8,10 +8,13 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sess
 from sqlalchemy.sql import text
 from httpx import AsyncClient, ASGITransport
 from app.main import app
-from app.db import get_db
-from app.schemas import UserCreate
+from app.db import Base, get_db
+from app.cache import membership_cache
+from app.schemas import ChatCreate, UserCreate
+from app.models import User
 from app.auth import create_access_token
-from app.crud import create_user
+from app.crud import add_chat_member, create_chat, create_message, create_user
+from app.dependencies import get_read_db, user_ids
 from dotenv import load_dotenv
 
 # Загружаем тестовые переменные окружения
@@ -118,3 +121,44 @@ async def client(session: AsyncSession):
         await cleanup_session.commit()
         await cleanup_session.close()
 
+
+@pytest_asyncio.fixture(scope="function")
+async def sqlite_sessions(tmp_path):
+    """Фабрика сессий к чистой базе SQLite в файле: для тестов crud без PostgreSQL"""
+    sqlite_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with sqlite_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    membership_cache._entries.clear()  # id чатов в каждой новой базе начинаются с 1
+    yield async_sessionmaker(sqlite_engine, expire_on_commit=False)
+    membership_cache._entries.clear()
+    await sqlite_engine.dispose()
+
+@pytest.fixture
+def seed_chat(sqlite_sessions):
+    """Создаёт в sqlite_sessions чат с участниками 1..members (пользователь members+1 вне чата)
+    и messages сообщений от пользователя 1. Возвращает (chat_id, [id сообщений])"""
+    async def seed(members: int = 3, messages: int = 0):
+        async with sqlite_sessions() as db:
+            db.add_all([User(name=f"User{i}", email=f"user{i}@example.com", password="x") for i in range(1, members + 2)])
+            await db.commit()
+            chat = await create_chat(db, ChatCreate(name="Test Chat", chat_type="group"))
+            for user_id in range(1, members + 1):
+                await add_chat_member(db, chat.id, user_id)
+            message_ids = [(await create_message(db, chat.id, 1, f"msg {i}")).id for i in range(messages)]
+        return chat.id, message_ids
+    return seed
+
+@pytest_asyncio.fixture(scope="function")
+async def api(sqlite_sessions):
+    """HTTP-клиент к приложению поверх sqlite_sessions, без запущенного сервера"""
+    async def override_get_db():
+        async with sqlite_sessions() as session:
+            yield session
+
+    user_ids._entries.clear()  # id пользователей — из этой базы
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db  # Без реплики все чтения — из той же базы
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+    user_ids._entries.clear()
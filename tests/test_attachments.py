@@ -0,0 +1,75 @@
+import hashlib
+import os
+import pytest
+from app.auth import create_access_token
+from app.crud import create_message
+from app.attachments import AttachmentStore, AttachmentTooLarge, attachment_store
+
+async def chunks(data: bytes, size: int = 1000):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+@pytest.mark.asyncio
+async def test_identical_files_are_stored_once(tmp_path):
+    """Файл ложится под своим SHA-256, повторная загрузка того же содержимого не создаёт копию"""
+    store = AttachmentStore(str(tmp_path), max_bytes=10_000, write_buffer=4096)
+    data = os.urandom(9_000)
+
+    sha256, size, created = await store.save(chunks(data))
+    assert (sha256, size, created) == (hashlib.sha256(data).hexdigest(), len(data), True)
+    with open(store.path(sha256), "rb") as f:
+        assert f.read() == data
+
+    assert await store.save(chunks(data, 777)) == (sha256, size, False)
+    assert os.listdir(tmp_path / "tmp") == []
+
+@pytest.mark.asyncio
+async def test_rejected_upload_leaves_no_files(tmp_path):
+    """Слишком большой или пустой файл не оставляет ни временных, ни постоянных файлов"""
+    store = AttachmentStore(str(tmp_path), max_bytes=5_000, write_buffer=1024)
+
+    with pytest.raises(AttachmentTooLarge):
+        await store.save(chunks(os.urandom(6_000)))
+    with pytest.raises(ValueError):
+        await store.save(chunks(b""))
+
+    assert os.listdir(tmp_path) == ["tmp"]
+    assert os.listdir(tmp_path / "tmp") == []
+
+@pytest.fixture
+def attachments_dir(tmp_path, monkeypatch):
+    """Вложения приложения — в tmp_path, файлы отдаёт сам воркер"""
+    monkeypatch.setattr(attachment_store, "root", str(tmp_path / "attachments"))
+    monkeypatch.setattr("app.api.ATTACHMENTS_ACCEL_REDIRECT", "")
+
+def auth(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': f'user{user_id}@example.com'})}"}
+
+@pytest.mark.asyncio
+async def test_attachment_download_is_limited_to_uploader_and_chat_members(api, attachments_dir, sqlite_sessions, seed_chat):
+    """Скачать файл могут автор и участники чата, куда он отправлен; остальным и по чужому id — 404"""
+    chat_id, _ = await seed_chat(members=2)
+    data = os.urandom(3_000)
+    response = await api.post("/attachments?filename=photo.bin", content=data,
+                              headers={**auth(1), "Content-Type": "application/octet-stream"})
+    assert response.status_code == 200
+    attachment_id = response.json()["attachment_id"]
+
+    # Ещё не отправлен в чат — виден только автору
+    assert (await api.get(f"/attachments/{attachment_id}", headers=auth(1))).content == data
+    assert (await api.get(f"/attachments/{attachment_id}", headers=auth(2))).status_code == 404
+
+    async with sqlite_sessions() as db:
+        await create_message(db, chat_id, 1, "файл", attachment_ids=(attachment_id,))
+
+    response = await api.get(f"/attachments/{attachment_id}", headers=auth(2))
+    assert response.status_code == 200
+    assert response.content == data
+    assert response.headers["etag"] == f'"{hashlib.sha256(data).hexdigest()}"'
+    assert (await api.get(f"/attachments/{attachment_id}", headers=auth(3))).status_code == 404
+    assert (await api.get(f"/attachments/{attachment_id + 1}", headers=auth(1))).status_code == 404
+
+    response = await api.get(f"/attachments/{attachment_id}", headers={**auth(2), "Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == data[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(data)}"
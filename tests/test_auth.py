@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+import pytest
+from passlib.context import CryptContext
+from sqlalchemy.future import select
+from app import auth
+from app.auth import PasswordHasher
+from app.models import User
+
+def bcrypt_context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+@pytest.mark.asyncio
+async def test_login_rehashes_password_after_rounds_change(api, sqlite_sessions, monkeypatch):
+    """После смены BCRYPT_ROUNDS вход с верным паролем сохраняет хэш с новыми параметрами"""
+    async with sqlite_sessions() as db:
+        db.add(User(name="Old", email="old@example.com", password=bcrypt_context(4).hash("secret")))
+        await db.commit()
+    monkeypatch.setattr(auth, "pwd_context", bcrypt_context(5))
+
+    async def stored_hash() -> str:
+        async with sqlite_sessions() as db:
+            return await db.scalar(select(User.password).where(User.email == "old@example.com"))
+
+    assert (await api.post("/token", data={"username": "old@example.com", "password": "wrong"})).status_code == 400
+    assert (await stored_hash()).startswith("$2b$04$")
+
+    response = await api.post("/token", data={"username": "old@example.com", "password": "secret"})
+    assert response.status_code == 200
+    assert (await stored_hash()).startswith("$2b$05$")
+    assert (await api.post("/token", data={"username": "old@example.com", "password": "secret"})).status_code == 200
+
+@pytest.mark.asyncio
+async def test_hasher_runs_at_most_max_concurrency_tasks(monkeypatch):
+    """В пул одновременно уходит не больше max_concurrency задач, остальные ждут очереди"""
+    hasher = PasswordHasher("thread", workers=4, max_concurrency=2)
+    lock = threading.Lock()
+    running, peak = 0, 0
+
+    def slow_hash(password):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return f"hash:{password}"
+
+    monkeypatch.setattr(auth, "get_password_hash", slow_hash)
+    tasks = [asyncio.create_task(hasher.hash(str(i))) for i in range(6)]
+    await asyncio.sleep(0.02)
+    assert (hasher.stats()["in_flight"], hasher.stats()["queued"]) == (2, 4)
+
+    assert await asyncio.gather(*tasks) == [f"hash:{i}" for i in range(6)]
+    hasher.shutdown()
+    assert peak == 2
+    assert hasher.stats()["completed"] == 6
+
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive_while_hashing():
+    """Пока bcrypt считает хэши в пуле, event loop продолжает обслуживать другие задачи"""
+    hasher = PasswordHasher("thread", workers=2)
+    gaps = []
+
+    async def ticker():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            gaps.append(time.perf_counter() - started)
+
+    ticking = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    hashes = await asyncio.gather(*(hasher.hash(f"password{i}") for i in range(4)))
+    elapsed = time.perf_counter() - started
+    ticking.cancel()
+    hasher.shutdown()
+
+    assert all(auth.verify_password(f"password{i}", hashed) for i, hashed in enumerate(hashes))
+    assert elapsed > 0.2  # bcrypt с BCRYPT_ROUNDS по умолчанию занял заметное время
+    assert max(gaps) < 0.1
@@ -0,0 +1,35 @@
+import pytest
+from app.cache import MembershipCache
+from app.pubsub import InMemoryBroker
+
+MEMBERS = {"chat_id": 1, "members": [{"id": 1, "name": "User1"}]}
+
+@pytest.mark.asyncio
+async def test_membership_cache_hits_and_lru():
+    """Попадания и промахи считаются, самый старый чат вытесняется"""
+    cache = MembershipCache(InMemoryBroker(), max_size=2, ttl=60)
+
+    assert cache.get(1) is None
+    cache.set(1, MEMBERS, cache.generation)
+    cache.set(2, MEMBERS, cache.generation)
+    assert cache.get(1) is MEMBERS
+    cache.set(3, MEMBERS, cache.generation)  # Вытесняет чат 2, к чату 1 недавно обращались
+
+    assert cache.get(2) is None
+    assert cache.get(1) is MEMBERS
+    assert cache.stats() == {"size": 2, "hits": 2, "misses": 2}
+
+@pytest.mark.asyncio
+async def test_membership_cache_invalidation_between_workers():
+    """Инвалидация на одном воркере сбрасывает запись и на другом"""
+    broker = InMemoryBroker()
+    cache_a = MembershipCache(broker)
+    cache_b = MembershipCache(broker)
+    cache_b.set(1, MEMBERS, cache_b.generation)
+
+    generation = cache_a.generation
+    await cache_a.invalidate(1)
+    cache_a.set(1, MEMBERS, generation)  # Результат запроса, начатого до инвалидации, не кэшируется
+
+    assert cache_a.get(1) is None
+    assert cache_b.get(1) is None
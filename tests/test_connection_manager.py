@@ -0,0 +1,141 @@
+import asyncio
+import json
+import pytest
+from app.pubsub import InMemoryBroker
+from app.protocol import typing_frame
+from app.websocket import ConnectionManager, DISCONNECT, DROP_OLDEST
+
+class FakeWebSocket:
+    """Заглушка WebSocket, запоминающая отправленные сообщения"""
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.closed_with = None
+        self.unblocked = asyncio.Event()
+        if not blocked:
+            self.unblocked.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        await self.unblocked.wait()  # Медленный клиент ждёт, пока его "разблокируют"
+        self.sent.append(message)
+
+    async def close(self, code: int):
+        self.closed_with = code
+
+async def wait_until(condition, timeout: float = 2.5):
+    """Ждём, пока writer-таски доставят сообщения"""
+    for _ in range(int(timeout / 0.05)):
+        if condition():
+            return
+        await asyncio.sleep(0.05)
+
+@pytest.mark.asyncio
+async def test_slow_client_does_not_block_others():
+    """Медленный клиент не задерживает доставку остальным, старые сообщения вытесняются"""
+    manager = ConnectionManager(InMemoryBroker(), queue_size=2, policy=DROP_OLDEST)
+    slow, fast = FakeWebSocket(blocked=True), FakeWebSocket()
+    await manager.connect(slow, 1)
+    await manager.connect(fast, 2)
+
+    for i in range(5):
+        await manager.send_many([1, 2], f"msg {i}")
+        await asyncio.sleep(0.01)  # Даём writer-ам поработать
+    await wait_until(lambda: len(fast.sent) == 5)
+    assert fast.sent == [f"msg {i}" for i in range(5)]
+
+    slow.unblocked.set()
+    await wait_until(lambda: len(slow.sent) == 3)
+    # Первое сообщение уже было у writer-а, из очереди остались два последних
+    assert slow.sent == ["msg 0", "msg 3", "msg 4"]
+
+@pytest.mark.asyncio
+async def test_slow_client_disconnected_on_overflow():
+    """С политикой disconnect переполнение очереди закрывает соединение"""
+    manager = ConnectionManager(InMemoryBroker(), queue_size=2, policy=DISCONNECT)
+    slow = FakeWebSocket(blocked=True)
+    await manager.connect(slow, 1)
+
+    for i in range(4):
+        await manager.send_message(1, f"msg {i}")
+    await wait_until(lambda: slow.closed_with is not None)
+
+    assert slow.closed_with == 1013
+    assert 1 not in manager.active_connections
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_only_room_connections():
+    """Сообщение чата получают только сокеты, открытые в этом чате, кроме отправителя"""
+    manager = ConnectionManager(InMemoryBroker())
+    sender, in_room, other_chat = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await manager.connect(sender, 1, chat_id=10)
+    await manager.connect(in_room, 2, chat_id=10)
+    await manager.connect(other_chat, 2, chat_id=20)  # То же устройство пользователя 2, но другой чат
+
+    await manager.broadcast(10, "привет", exclude_user=1)
+    await wait_until(lambda: in_room.sent)
+
+    assert in_room.sent == ["привет"]
+    assert sender.sent == []
+    assert other_chat.sent == []
+
+    manager.disconnect(2, in_room)
+    assert manager.rooms[10] == {manager.active_connections[1][0]}
+
+@pytest.mark.asyncio
+async def test_replay_holds_live_messages_without_duplicates():
+    """Во время догрузки живые сообщения откладываются, уже догруженные не дублируются"""
+    manager = ConnectionManager(InMemoryBroker())
+    ws = FakeWebSocket()
+    connection = await manager.connect(ws, 2, chat_id=7, replay=True)
+
+    await manager.broadcast(7, "live 10", exclude_user=1, message_id=10)  # Попадёт и в догрузку
+    await manager.broadcast(7, "live 12", exclude_user=1, message_id=12)
+    assert await manager.send_replay(connection, "backlog 9-10", [9, 10])
+    manager.finish_replay(connection, [9, 10])
+    await manager.broadcast(7, "live 10", exclude_user=1, message_id=10)  # Запоздавшая рассылка
+    await manager.broadcast(7, "live 13", exclude_user=1, message_id=13)
+    await wait_until(lambda: len(ws.sent) == 3)
+
+    assert ws.sent == ["backlog 9-10", "live 12", "live 13"]
+
+@pytest.mark.asyncio
+async def test_ephemeral_events_are_rate_limited_and_coalesced():
+    """Набор текста: первое событие сразу, остальные за интервал сливаются в последнее; брокер не участвует"""
+    broker = InMemoryBroker()
+    manager = ConnectionManager(broker, ephemeral_interval_ms=100)
+    broker.publish = None  # Эфемерные события не должны идти через брокер
+    typist, reader, other_chat = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await manager.connect(typist, 1, chat_id=5)
+    await manager.connect(reader, 2, chat_id=5)
+    await manager.connect(other_chat, 3, chat_id=6)
+
+    for state in ("typing 1", "typing 2", "typing 3", "stopped"):
+        manager.publish_ephemeral(5, 1, "typing", state)
+    await wait_until(lambda: reader.sent)
+    assert reader.sent == ["typing 1"]
+
+    await wait_until(lambda: len(reader.sent) == 2)
+    assert reader.sent == ["typing 1", "stopped"]
+    assert typist.sent == [] and other_chat.sent == []
+
+@pytest.mark.asyncio
+async def test_pending_typing_is_replaced_by_stop_on_last_disconnect():
+    """Отложенный "печатает" не приходит после отключения: вместо него сразу typing: false"""
+    manager = ConnectionManager(InMemoryBroker(), ephemeral_interval_ms=100)
+    phone, laptop, reader = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    phone_connection = await manager.connect(phone, 1, chat_id=5)
+    laptop_connection = await manager.connect(laptop, 1, chat_id=5)
+    await manager.connect(reader, 2, chat_id=5)
+
+    manager.publish_ephemeral(5, 1, "typing", typing_frame(5, 1, True))
+    manager.publish_ephemeral(5, 1, "typing", typing_frame(5, 1, True))  # Ждёт конца интервала
+    manager.disconnect(1, phone)
+    manager.end_typing(phone_connection)  # Ноутбук ещё в чате: ничего не меняется
+    manager.disconnect(1, laptop)
+    manager.end_typing(laptop_connection)
+
+    await asyncio.sleep(0.2)  # Интервал прошёл, отменённый кадр не пришёл
+    assert [json.loads(frame)["typing"] for frame in reader.sent] == [True, False]
+
@@ -0,0 +1,20 @@
+from datetime import timedelta
+from app import dependencies
+from app.auth import create_access_token
+from app.dependencies import verify_token
+
+def test_verified_token_is_cached(monkeypatch):
+    """Повторная проверка того же токена не вызывает jwt.decode"""
+    token = create_access_token({"sub": "cached@example.com"})
+    assert verify_token(token) == "cached@example.com"
+
+    def fail_decode(*args, **kwargs):
+        raise AssertionError("токен должен браться из кэша")
+
+    monkeypatch.setattr(dependencies.jwt, "decode", fail_decode)
+    assert verify_token(token) == "cached@example.com"
+
+def test_expired_and_invalid_tokens_rejected():
+    expired = create_access_token({"sub": "old@example.com"}, expires_delta=timedelta(minutes=-1))
+    assert verify_token(expired) is None
+    assert verify_token("not-a-token") is None
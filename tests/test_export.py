@@ -0,0 +1,40 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+from app.crud import create_message
+from app.export import CSV_COLUMNS, export_chat
+
+TEXTS = ["привет", 'с "кавычками", запятой', "две\nстроки"]
+
+async def collect(chat_id: int, sessions, export_format: str, compress: bool = False) -> bytes:
+    return b"".join([chunk async for chunk in export_chat(chat_id, export_format, compress, session_factory=sessions)])
+
+@pytest.fixture
+async def chat_with_messages(sqlite_sessions, seed_chat, monkeypatch):
+    monkeypatch.setattr("app.export.EXPORT_BATCH_SIZE", 2)  # Несколько пачек с серверного курсора
+    chat_id, _ = await seed_chat(members=2)
+    async with sqlite_sessions() as db:
+        ids = [(await create_message(db, chat_id, 1 + i % 2, text)).id for i, text in enumerate(TEXTS)]
+    return chat_id, ids
+
+@pytest.mark.asyncio
+async def test_ndjson_export_has_one_message_per_line(sqlite_sessions, chat_with_messages):
+    chat_id, ids = chat_with_messages
+    lines = (await collect(chat_id, sqlite_sessions, "ndjson")).decode().splitlines()
+
+    rows = [json.loads(line) for line in lines]
+    assert [(row["id"], row["sender_id"], row["text"]) for row in rows] == [(ids[i], 1 + i % 2, TEXTS[i]) for i in range(3)]
+    assert all(row["timestamp"] for row in rows)
+
+@pytest.mark.asyncio
+async def test_csv_export_quotes_text_and_gzip_matches_plain(sqlite_sessions, chat_with_messages):
+    chat_id, ids = chat_with_messages
+    plain = await collect(chat_id, sqlite_sessions, "csv")
+
+    rows = list(csv.reader(io.StringIO(plain.decode(), newline="")))
+    assert tuple(rows[0]) == CSV_COLUMNS
+    assert [(int(row[0]), int(row[1]), row[3]) for row in rows[1:]] == [(ids[i], 1 + i % 2, TEXTS[i]) for i in range(3)]
+
+    assert gzip.decompress(await collect(chat_id, sqlite_sessions, "csv", compress=True)) == plain
@@ -0,0 +1,75 @@
+import asyncio
+import sqlite3
+import pytest
+from sqlalchemy import event
+from app.ingest import MessageIngestor
+
+class CountingSessions:
+    """Фабрика сессий, считающая транзакции записи; fail=True — база недоступна"""
+    def __init__(self, sessions):
+        self.sessions = sessions
+        self.opened = 0
+        self.fail = False
+
+    def __call__(self):
+        self.opened += 1
+        if self.fail:
+            raise ConnectionError("база недоступна")
+        return self.sessions()
+
+@pytest.mark.asyncio
+async def test_concurrent_messages_are_written_in_batches(sqlite_sessions, seed_chat):
+    """Одновременные сообщения пишутся пачками по flush_size, повтор client_id — дубликат"""
+    chat_id, _ = await seed_chat(members=2)
+    sessions = CountingSessions(sqlite_sessions)
+    ingestor = MessageIngestor(sessions, flush_size=3, flush_interval_ms=50)
+
+    results = await asyncio.gather(*(
+        ingestor.submit(chat_id, 1, f"сообщение {i}", client_id=str(i)) for i in range(5)
+    ), ingestor.submit(chat_id, 1, "повтор", client_id="0"))
+    await ingestor.stop()
+
+    assert [message.text for message in results[:5]] == [f"сообщение {i}" for i in range(5)]
+    assert len({message.id for message in results[:5]}) == 5
+    assert results[5] == {"error": "⚠️ Сообщение уже отправлено"}
+    assert sessions.opened == 2
+
+@pytest.mark.asyncio
+async def test_batch_failure_is_raised_to_every_sender(sqlite_sessions, seed_chat):
+    """Ошибка записи пачки доходит до всех её отправителей, следующая пачка пишется как обычно"""
+    chat_id, _ = await seed_chat(members=2)
+    sessions = CountingSessions(sqlite_sessions)
+    ingestor = MessageIngestor(sessions, flush_size=10, flush_interval_ms=20)
+
+    sessions.fail = True
+    results = await asyncio.gather(
+        *(ingestor.submit(chat_id, 1, f"сообщение {i}") for i in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+    sessions.fail = False
+    message = await ingestor.submit(chat_id, 1, "после сбоя")
+    await ingestor.stop()
+    assert message.text == "после сбоя"
+
+@pytest.mark.asyncio
+async def test_rejected_row_fails_only_its_sender(sqlite_sessions, seed_chat):
+    """Строку, которую БД отвергла как данные (DataError), не пишут, остальные сообщения пачки сохраняются"""
+    chat_id, _ = await seed_chat(members=2)
+    engine = sqlite_sessions.kw["bind"]
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def limit_length(dbapi_connection, connection_record):
+        # Длиннее лимита SQLite отвечает SQLITE_TOOBIG (DataError) — как PostgreSQL на NUL в тексте
+        dbapi_connection.driver_connection._conn.setlimit(sqlite3.SQLITE_LIMIT_LENGTH, 1000)
+
+    await engine.dispose()  # Лимит применяется к новым соединениям
+    ingestor = MessageIngestor(sqlite_sessions, flush_size=10, flush_interval_ms=20)
+    good, bad = await asyncio.gather(
+        ingestor.submit(chat_id, 1, "обычное сообщение"),
+        ingestor.submit(chat_id, 2, "x" * 2000),
+    )
+    await ingestor.stop()
+
+    assert good.text == "обычное сообщение"
+    assert "error" in bad
@@ -0,0 +1,21 @@
+import logging
+import queue
+from app import log
+from app.log import DeferredQueueHandler, log_event
+
+def test_log_event_sampling_and_bounded_queue(monkeypatch):
+    """Сэмплированные события отбрасываются до очереди, переполненная очередь не блокирует"""
+    log_queue = queue.Queue(maxsize=2)
+    handler = DeferredQueueHandler(log_queue)
+    monkeypatch.setattr(log.logger, "handlers", [handler])
+    monkeypatch.setattr(log.logger, "level", logging.DEBUG)
+    monkeypatch.setattr(log, "LOG_SAMPLE_RATES", {"ws.message": 0.0})
+
+    log_event(logging.DEBUG, "ws.message", user_id=1)
+    assert log_queue.empty()
+
+    for _ in range(3):
+        log_event(logging.INFO, "ws.connect", user_id=1, chat_id=2)
+    record = log_queue.get_nowait()
+    assert record.event == "ws.connect" and record.fields == {"user_id": 1, "chat_id": 2}
+    assert handler.dropped == 1
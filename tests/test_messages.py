@@ -0,0 +1,250 @@
+import asyncio
+import sqlite3
+import time
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import event, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.cache import membership_cache
+from app.config import MESSAGE_DEDUP_WINDOW_SECONDS
+from app.crud import (
+    create_chat, add_chat_member, add_chat_members_bulk, get_chat_members, create_message, create_messages_bulk, encode_cursor, get_messages,
+    get_user_chats, mark_message_as_read, advance_read_watermark, search_messages, encode_search_cursor, timestamp_param,
+)
+from app.models import Message
+from app.schemas import ChatCreate
+
+@pytest.mark.asyncio
+async def test_fully_read_is_reported_once(sqlite_sessions, seed_chat):
+    """Повторное прочтение и поздние читатели не сообщают "прочитано всеми" ещё раз"""
+    chat_id, (message_id,) = await seed_chat(members=3, messages=1)
+
+    async with sqlite_sessions() as db:
+        assert (await mark_message_as_read(db, message_id, 2))["fully_read"] is False
+        assert (await mark_message_as_read(db, message_id, 3))["fully_read"] is True
+        assert (await mark_message_as_read(db, message_id, 3))["fully_read"] is False  # Повтор
+
+        await add_chat_member(db, chat_id, 4)
+        assert (await mark_message_as_read(db, message_id, 4))["fully_read"] is False  # Поздний участник
+        assert (await mark_message_as_read(db, message_id, 1))["fully_read"] is False  # Сам отправитель
+
+@pytest.mark.asyncio
+async def test_sender_read_does_not_count(sqlite_sessions, seed_chat):
+    """Отправитель, прочитавший своё сообщение, не приближает "прочитано всеми" """
+    _, (message_id,) = await seed_chat(members=3, messages=1)
+
+    async with sqlite_sessions() as db:
+        assert (await mark_message_as_read(db, message_id, 1))["fully_read"] is False
+        assert (await mark_message_as_read(db, message_id, 2))["fully_read"] is False
+        assert (await mark_message_as_read(db, message_id, 3))["fully_read"] is True
+
+@pytest.mark.asyncio
+async def test_non_member_cannot_read(sqlite_sessions, seed_chat):
+    """Не участник чата получает "не найдено" и не влияет на счётчик"""
+    _, (message_id,) = await seed_chat(members=2, messages=1)
+
+    async with sqlite_sessions() as db:
+        assert "error" in await mark_message_as_read(db, message_id, 3)  # Пользователь 3 не в чате
+        assert "error" in await mark_message_as_read(db, message_id + 100, 2)
+        assert (await mark_message_as_read(db, message_id, 2))["fully_read"] is True
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_row_by_row(sqlite_sessions, seed_chat):
+    """Нарушение ограничения в одной строке пачки не мешает сохранить остальные"""
+    chat_id, _ = await seed_chat(members=2)
+
+    async with sqlite_sessions() as db:
+        results = await create_messages_bulk(db, [
+            (chat_id, 1, "первое", "a", ()),
+            (chat_id, 1, "битое", "b", (7, 7)),  # Повтор связи сообщение—вложение нарушает первичный ключ
+            (chat_id, 2, "второе", "c", ()),
+        ])
+
+    assert [result.text for result in (results[0], results[2])] == ["первое", "второе"]
+    assert "error" in results[1]
+
+@pytest.mark.asyncio
+async def test_history_pages_with_before_and_after_cursors(sqlite_sessions, seed_chat):
+    """Страницы истории не теряют и не повторяют сообщения, в том числе с одинаковым timestamp"""
+    chat_id, message_ids = await seed_chat(members=2, messages=7)
+
+    async with sqlite_sessions() as db:
+        first = await get_messages(db, chat_id, limit=3)
+        second = await get_messages(db, chat_id, limit=3, after=encode_cursor(first[-1]))
+        third = await get_messages(db, chat_id, limit=3, after=encode_cursor(second[-1]))
+        assert [row.id for row in first + second + third] == message_ids
+
+        previous = await get_messages(db, chat_id, limit=3, before=encode_cursor(third[0]))
+        assert [row.id for row in previous] == message_ids[3:6]
+        assert await get_messages(db, chat_id, limit=3, before=encode_cursor(first[0])) == []
+
+@pytest.mark.asyncio
+async def test_replica_reads_do_not_fill_membership_cache(sqlite_sessions, seed_chat):
+    """Состав чата из реплики не попадает в общий кэш, из primary — попадает"""
+    chat_id, _ = await seed_chat(members=2)
+
+    async with sqlite_sessions(info={"replica": True}) as db:
+        assert len((await get_chat_members(db, chat_id))["members"]) == 2
+    assert membership_cache.get(chat_id) is None
+
+    async with sqlite_sessions() as db:
+        await get_chat_members(db, chat_id)
+    assert len(membership_cache.get(chat_id)["members"]) == 2
+
+@pytest.mark.asyncio
+async def test_inbox_unread_counts_follow_watermark(sqlite_sessions, seed_chat):
+    """Непрочитанные — чужие сообщения после водяного знака, в том числе у поздно вступивших"""
+    chat_id, message_ids = await seed_chat(members=3, messages=4)
+
+    async def unread(user_id: int) -> int:
+        async with sqlite_sessions() as db:
+            (chat,) = await get_user_chats(db, user_id)
+        return chat["unread_count"]
+
+    assert [await unread(user_id) for user_id in (1, 2, 3)] == [0, 4, 4]
+
+    async with sqlite_sessions() as db:
+        await advance_read_watermark(db, chat_id, 2, message_ids[1])
+        await add_chat_member(db, chat_id, 4)
+        reply = await create_message(db, chat_id, 2, "ответ")
+        assert (await get_user_chats(db, 4))[0]["last_message"]["id"] == reply.id
+    assert [await unread(user_id) for user_id in (1, 2, 3, 4)] == [1, 2, 5, 5]
+
+@pytest.mark.asyncio
+async def test_inbox_unread_count_is_capped(sqlite_sessions, seed_chat, monkeypatch):
+    """Подсчёт непрочитанных не просматривает историю дальше INBOX_UNREAD_LIMIT"""
+    monkeypatch.setattr("app.crud.INBOX_UNREAD_LIMIT", 3)
+    await seed_chat(members=2, messages=5)
+
+    async with sqlite_sessions() as db:
+        assert (await get_user_chats(db, 2))[0]["unread_count"] == 3
+
+@pytest.mark.asyncio
+async def test_read_watermark_only_moves_forward(sqlite_sessions, seed_chat):
+    """Водяной знак не откатывается назад и не обгоняет последнее сообщение чата"""
+    chat_id, message_ids = await seed_chat(members=3, messages=4)
+
+    async with sqlite_sessions() as db:
+        result = await advance_read_watermark(db, chat_id, 2, message_ids[2])
+        assert (result["last_read_message_id"], result["fully_read"]) == (message_ids[2], [])
+
+        result = await advance_read_watermark(db, chat_id, 2, message_ids[0])
+        assert (result["last_read_message_id"], result["fully_read"]) == (message_ids[2], [])
+
+        result = await advance_read_watermark(db, chat_id, 3, message_ids[-1] + 100)
+        assert result["last_read_message_id"] == message_ids[-1]
+        assert [message["id"] for message in result["fully_read"]] == message_ids[:3]
+
+        assert "error" in await advance_read_watermark(db, chat_id, 4, message_ids[-1])
+
+@pytest.mark.asyncio
+async def test_history_route_rejects_both_cursors_and_documents_response(api, seed_chat):
+    """Одновременно before и after — 422; схема ответа /history остаётся в OpenAPI"""
+    chat_id, message_ids = await seed_chat(members=2, messages=3)
+
+    response = await api.get(f"/history/{chat_id}", params={"limit": 2})
+    assert [message["id"] for message in response.json()] == message_ids[:2]
+    cursor = response.headers["x-next-cursor"]
+    assert (await api.get(f"/history/{chat_id}", params={"before": cursor, "after": cursor})).status_code == 422
+
+    schema = (await api.get("/openapi.json")).json()["paths"]["/history/{chat_id}"]["get"]["responses"]["200"]
+    assert schema["content"]["application/json"]["schema"]["items"]["$ref"].endswith("/MessageResponse")
+
+@pytest.mark.asyncio
+async def test_bulk_add_counts_duplicates_and_unknown_users(sqlite_sessions, seed_chat):
+    """Повторы в запросе считаются один раз, участники пропускаются, неизвестные id — missing"""
+    chat_id, _ = await seed_chat(members=2)
+
+    async with sqlite_sessions() as db:
+        await get_chat_members(db, chat_id)  # Кэш должен сброситься после добавления
+        result = await add_chat_members_bulk(db, chat_id, [2, 3, 3, 99, 1])
+        assert result == {"chat_id": chat_id, "added": 1, "skipped": 2, "missing": 1}
+        assert sorted(member["id"] for member in (await get_chat_members(db, chat_id))["members"]) == [1, 2, 3]
+
+        assert (await add_chat_members_bulk(db, chat_id, [3]))["added"] == 0
+        assert "error" in await add_chat_members_bulk(db, chat_id + 1, [1])
+
+@pytest.mark.asyncio
+async def test_bulk_add_above_sqlite_parameter_limit(sqlite_sessions, seed_chat):
+    """Список длиннее лимита параметров SQLite (32766) добавляется пачками"""
+    chat_id, _ = await seed_chat(members=1)
+    engine = sqlite_sessions.kw["bind"]
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def limit_variables(dbapi_connection, connection_record):
+        # Сборки SQLite в дистрибутивах часто поднимают лимит, а по умолчанию он 32766
+        dbapi_connection.driver_connection._conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 32766)
+
+    await engine.dispose()  # Лимит применяется к новым соединениям
+
+    async with sqlite_sessions() as db:
+        result = await add_chat_members_bulk(db, chat_id, list(range(1, 33_001)))
+        assert result == {"chat_id": chat_id, "added": 1, "skipped": 1, "missing": 32_998}
+        assert sorted(member["id"] for member in (await get_chat_members(db, chat_id))["members"]) == [1, 2]
+
+@pytest.mark.asyncio
+async def test_search_ranks_and_pages_within_chat(sqlite_sessions, seed_chat):
+    """Поиск находит сообщения только своего чата, более релевантные первыми, и листается курсором"""
+    chat_id, _ = await seed_chat(members=2)
+    async with sqlite_sessions() as db:
+        other_chat = await create_chat(db, ChatCreate(name="Other", chat_type="group"))
+        await create_message(db, other_chat.id, 1, "привет из другого чата")
+        once = await create_message(db, chat_id, 1, "привет, как дела у нашей команды сегодня")
+        await create_message(db, chat_id, 2, "пока")
+        often = await create_message(db, chat_id, 2, "привет привет привет")
+
+        first = await search_messages(db, chat_id, "Привет", limit=1)
+        second = await search_messages(db, chat_id, "привет", limit=1, after=encode_search_cursor(first[0]))
+        rest = await search_messages(db, chat_id, "привет", limit=1, after=encode_search_cursor(second[0]))
+
+        assert [result["id"] for result in first + second + rest] == [often.id, once.id]
+        assert first[0]["score"] > second[0]["score"]
+        assert await search_messages(db, chat_id, "!!!") == []
+
+@pytest.mark.asyncio
+async def test_last_readers_advancing_together_mark_messages_read(sqlite_sessions, seed_chat, monkeypatch):
+    """Два последних читателя сдвигают водяной знак одновременно — сообщения всё равно прочитаны всеми"""
+    chat_id, message_ids = await seed_chat(members=3, messages=2)
+
+    execute = AsyncSession.execute
+    async def interleaved_execute(self, *args, **kwargs):
+        # Пауза после каждого запроса: запросы двух читателей чередуются
+        result = await execute(self, *args, **kwargs)
+        await asyncio.sleep(0.05)
+        return result
+    monkeypatch.setattr(AsyncSession, "execute", interleaved_execute)
+
+    async def advance(user_id: int):
+        async with sqlite_sessions() as db:
+            return await advance_read_watermark(db, chat_id, user_id, message_ids[-1])
+
+    results = await asyncio.gather(advance(2), advance(3))
+    assert sorted(message["id"] for result in results for message in result["fully_read"]) == message_ids
+
+@pytest.mark.asyncio
+async def test_retry_across_dedup_window_boundary_is_duplicate(sqlite_sessions, seed_chat, monkeypatch):
+    """Повтор без client_id через 0.2 с, но уже в следующем окне, всё равно дубликат"""
+    chat_id, _ = await seed_chat(members=2)
+    boundary = (time.time() // MESSAGE_DEDUP_WINDOW_SECONDS + 1) * MESSAGE_DEDUP_WINDOW_SECONDS
+
+    async def set_sent_at(db, message_id: int, sent_at: float):
+        # Время в БД — по тем же подменённым часам, что и окна дедупликации
+        sent_at = timestamp_param(db, datetime.fromtimestamp(sent_at, timezone.utc))
+        await db.execute(update(Message).where(Message.id == message_id).values(timestamp=sent_at))
+        await db.commit()
+
+    async with sqlite_sessions() as db:
+        monkeypatch.setattr(time, "time", lambda: boundary - 0.1)
+        first = await create_message(db, chat_id, 1, "привет")
+        await set_sent_at(db, first.id, boundary - 0.1)
+        monkeypatch.setattr(time, "time", lambda: boundary + 0.1)
+        retry = await create_message(db, chat_id, 1, "привет")
+        other = await create_message(db, chat_id, 1, "привет всем")
+        assert retry == {"error": "⚠️ Сообщение уже отправлено"}
+
+        # Тот же текст позже окна после первого — уже новое сообщение
+        await set_sent_at(db, first.id, boundary - MESSAGE_DEDUP_WINDOW_SECONDS - 5)
+        again = await create_message(db, chat_id, 1, "привет")
+
+    assert first.text == "привет" and other.text == "привет всем"
+    assert again.text == "привет" and again.id != first.id
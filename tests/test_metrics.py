@@ -0,0 +1,23 @@
+from app.metrics import Counter, Gauge, Histogram, registry, render_metrics
+
+def test_histogram_and_gauge_rendering():
+    """Гистограмма накапливает бакеты, gauge снимается функцией при рендере"""
+    histogram = Histogram("test_latency_seconds", "Тестовая задержка", ("kind",), buckets=(0.1, 1))
+    counter = Counter("test_events_total", "Тестовые события", ("policy",))
+    gauge = Gauge("test_connections", "Тестовые соединения", lambda: 3)
+    try:
+        histogram.observe(0.05, "select")
+        histogram.observe(0.5, "select")
+        histogram.observe(7, "select")
+        counter.inc(1, "drop_oldest")
+        text = render_metrics()
+    finally:
+        for metric in (histogram, counter, gauge):
+            registry.remove(metric)
+
+    assert 'test_latency_seconds_bucket{kind="select",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{kind="select",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{kind="select",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{kind="select"} 3' in text
+    assert 'test_events_total{policy="drop_oldest"} 1' in text
+    assert "# TYPE test_connections gauge\ntest_connections 3" in text
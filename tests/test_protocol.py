@@ -0,0 +1,34 @@
+from app.config import MESSAGE_MAX_BYTES
+from app.protocol import ERROR, MESSAGE, READ, TYPING, parse_frame
+
+def test_plain_text_and_message_frames():
+    assert parse_frame("привет") == {"type": MESSAGE, "text": "привет", "client_id": None, "attachments": ()}
+    assert parse_frame('{"text": "hi", "client_id": 7, "attachments": [3, 3, 4]}') == {
+        "type": MESSAGE, "text": "hi", "client_id": "7", "attachments": (3, 4)
+    }
+    assert parse_frame('{"type": "read", "up_to": 5}') == {"type": READ, "up_to": 5}
+    assert parse_frame('{"type": "typing", "typing": false}') == {"type": TYPING, "typing": False}
+
+def test_unknown_or_malformed_typed_frames_are_not_messages():
+    """Кадр с type, который не прошёл проверку, не должен сохраниться как текст сообщения"""
+    for data in (
+        '{"type": "presence", "online": true}',
+        '{"type": "read", "up_to": "5"}',
+        '{"type": "read", "up_to": true}',
+        '{"type": "message"}',
+        '{"text": "hi", "attachments": [true]}',
+        '{"text": "hi", "attachments": "1"}',
+    ):
+        assert parse_frame(data)["type"] == ERROR, data
+
+def test_oversized_text_is_rejected_before_persisting():
+    """Текст, который не уложится в кадр NOTIFY, отклоняется до записи, с учётом UTF-8 и экранирования"""
+    assert parse_frame("я" * (MESSAGE_MAX_BYTES // 2 - 1))["type"] == MESSAGE
+    assert parse_frame("я" * (MESSAGE_MAX_BYTES // 2))["type"] == ERROR
+    control_chars = "\\u0001" * (MESSAGE_MAX_BYTES // 5)  # Каждый такой символ в JSON занимает 6 байт
+    assert parse_frame('{"text": "' + control_chars + '"}')["type"] == ERROR
+
+def test_nul_in_text_is_rejected():
+    """NUL отвергается и в обычном тексте, и в JSON-кадре (\\u0000)"""
+    assert parse_frame("при\x00вет")["type"] == ERROR
+    assert parse_frame('{"text": "при\\u0000вет"}')["type"] == ERROR
@@ -0,0 +1,125 @@
+import os
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.sql import text
+from app.pubsub import Broker, InMemoryBroker, PostgresBroker
+from app.websocket import ConnectionManager
+
+class FakeWebSocket:
+    """Заглушка WebSocket, запоминающая отправленные сообщения"""
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        self.sent.append(message)
+
+async def wait_until(condition, timeout: float = 2.5):
+    """Ждём, пока writer-таски и брокер доставят сообщения"""
+    for _ in range(int(timeout / 0.05)):
+        if condition():
+            return
+        await asyncio.sleep(0.05)
+
+@pytest.mark.asyncio
+async def test_fanout_between_workers_in_memory():
+    """Два воркера с общим брокером: каждый доставляет только своим сокетам"""
+    broker = InMemoryBroker()
+    worker_a = ConnectionManager(broker)
+    worker_b = ConnectionManager(broker)
+
+    ws_a, ws_b = FakeWebSocket(), FakeWebSocket()
+    await worker_a.connect(ws_a, 1)
+    await worker_b.connect(ws_b, 2)
+
+    await worker_a.send_message(2, "привет")
+    await wait_until(lambda: ws_b.sent)
+
+    assert ws_b.sent == ["привет"]
+    assert ws_a.sent == []
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not os.getenv("PUBSUB_TEST_DATABASE_URL"), reason="PUBSUB_TEST_DATABASE_URL не задан")
+async def test_fanout_between_workers_postgres():
+    """Два воркера со своими engine и LISTEN/NOTIFY в одной базе"""
+    engine_a = create_async_engine(os.getenv("PUBSUB_TEST_DATABASE_URL"))
+    engine_b = create_async_engine(os.getenv("PUBSUB_TEST_DATABASE_URL"))
+    worker_a = ConnectionManager(PostgresBroker(engine_a))
+    worker_b = ConnectionManager(PostgresBroker(engine_b))
+    await worker_a.broker.start()
+    await worker_b.broker.start()
+
+    try:
+        ws_a, ws_b = FakeWebSocket(), FakeWebSocket()
+        await worker_a.connect(ws_a, 1)
+        await worker_b.connect(ws_b, 2)
+
+        await worker_a.send_message(2, "привет")
+        await wait_until(lambda: ws_b.sent)
+
+        assert ws_b.sent == ["привет"]
+        assert ws_a.sent == []
+    finally:
+        await worker_a.broker.stop()
+        await worker_b.broker.stop()
+        await engine_a.dispose()
+        await engine_b.dispose()
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not os.getenv("PUBSUB_TEST_DATABASE_URL"), reason="PUBSUB_TEST_DATABASE_URL не задан")
+async def test_postgres_broker_survives_handler_errors_and_lost_connection():
+    """Ошибка обработчика и обрыв соединения LISTEN не останавливают доставку"""
+    engine = create_async_engine(os.getenv("PUBSUB_TEST_DATABASE_URL"))
+    broker = PostgresBroker(engine, backoff_max=0.2)
+    received = []
+
+    async def handler(payload: dict):
+        if payload.get("fail"):
+            raise RuntimeError("сбой обработчика")
+        received.append(payload["n"])
+
+    broker.subscribe("test_resilience", handler)
+    await broker.start()
+    try:
+        await broker.publish("test_resilience", {"fail": True})
+        await broker.publish("test_resilience", {"n": 1})
+        await wait_until(lambda: received == [1])
+
+        listen_conn = broker._conn
+        async with engine.begin() as conn:
+            await conn.execute(text("SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                                    "WHERE query LIKE 'LISTEN%' AND pid <> pg_backend_pid()"))
+        await wait_until(lambda: broker._conn not in (None, listen_conn) and not broker._lost.is_set())
+        await broker.publish("test_resilience", {"n": 2})
+        await wait_until(lambda: received == [1, 2])
+
+        assert received == [1, 2]
+    finally:
+        await broker.stop()
+        await engine.dispose()
+
+def test_broker_without_publish_cannot_be_created():
+    """Broker — абстрактный: бэкенд обязан реализовать publish"""
+    class Incomplete(Broker):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not os.getenv("PUBSUB_TEST_DATABASE_URL"), reason="PUBSUB_TEST_DATABASE_URL не задан")
+async def test_stopped_broker_does_not_leave_listening_connection_in_pool():
+    """После stop() соединение из пула не подписано ни на один канал"""
+    engine = create_async_engine(os.getenv("PUBSUB_TEST_DATABASE_URL"), pool_size=1, max_overflow=0)
+    broker = PostgresBroker(engine)
+    broker.subscribe("test_stop", InMemoryBroker().dispatch)
+    await broker.start()
+    await broker.stop()
+    try:
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT pg_listening_channels()"))).fetchall() == []
+    finally:
+        await engine.dispose()
@@ -0,0 +1,86 @@
+import time
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.sql import text
+from app.auth import create_access_token
+from app.db import Base, ReadRouter
+from app.dependencies import get_read_db
+from app.main import app
+
+@pytest.fixture
+async def databases(tmp_path):
+    """Два файла SQLite: primary и "реплика", в которой пока нет последней записи"""
+    engines = [create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}") for name in ("primary.db", "replica.db")]
+    for engine, rows in zip(engines, (2, 1)):
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE messages (id INTEGER PRIMARY KEY)"))
+            for message_id in range(1, rows + 1):
+                await conn.execute(text("INSERT INTO messages (id) VALUES (:id)"), {"id": message_id})
+    yield [async_sessionmaker(bind=engine) for engine in engines]
+    for engine in engines:
+        await engine.dispose()
+
+async def count_messages(router: ReadRouter, last_write: float = None) -> int:
+    async with (await router.session_factory(last_write))() as session:
+        return await session.scalar(text("SELECT COUNT(*) FROM messages"))
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica_except_after_own_writes(databases):
+    """Чтения идут в реплику, но клиент, писавший меньше sticky_seconds назад, читает из primary"""
+    primary, replica = databases
+    router = ReadRouter(primary, replica, sticky_seconds=60)
+
+    assert await count_messages(router) == 1
+    assert await count_messages(router, time.time() - 1) == 2
+    assert await count_messages(router, time.time() - 120) == 1
+
+    router.sticky_seconds = 0
+    assert await count_messages(router, time.time()) == 1
+
+@pytest.mark.asyncio
+async def test_lagging_or_unavailable_replica_falls_back_to_primary(databases):
+    """Отставшая или недоступная реплика не используется"""
+    primary, replica = databases
+    router = ReadRouter(primary, replica, max_lag=5, lag_check_interval=60)
+
+    router.lag, router._lag_checked_at = 30.0, float("inf")  # Последняя проверка показала отставание
+    assert await count_messages(router) == 2
+
+    broken = ReadRouter(primary, async_sessionmaker(bind=create_async_engine("sqlite+aiosqlite:////nonexistent/dir/x.db")))
+    assert await count_messages(broken) == 2
+    assert broken.lag == float("inf")
+
+@pytest.mark.asyncio
+async def test_write_marker_travels_with_client_to_any_worker(api, sqlite_sessions, seed_chat, tmp_path, monkeypatch):
+    """Отметку о записи хранит клиент: чтение на другом воркере после записи тоже идёт в primary"""
+    chat_id, (message_id,) = await seed_chat(members=2, messages=1)
+    replica_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)  # Реплика ещё не получила ни одной строки
+    replica = async_sessionmaker(replica_engine, expire_on_commit=False, info={"replica": True})
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'user2@example.com'})}"}
+
+    def worker():
+        # Новый ReadRouter — как другой процесс: в памяти о записях клиента ничего нет
+        monkeypatch.setattr("app.dependencies.read_router", ReadRouter(sqlite_sessions, replica, sticky_seconds=60))
+
+    app.dependency_overrides.pop(get_read_db)  # Здесь проверяется сама маршрутизация чтений
+    try:
+        worker()
+        assert (await api.get("/users/me/chats", headers=headers)).json() == []
+
+        response = await api.put(f"/chats/{chat_id}/read?up_to={message_id}", headers=headers)
+        assert response.status_code == 200
+        written_at = float(response.headers["x-last-write"])
+        assert abs(written_at - time.time()) < 5
+        assert api.cookies["last_write"] == response.headers["x-last-write"]
+
+        worker()
+        assert [chat["chat_id"] for chat in (await api.get("/users/me/chats", headers=headers)).json()] == [chat_id]
+
+        api.cookies.clear()
+        assert (await api.get("/users/me/chats", headers=headers)).json() == []
+        response = await api.get("/users/me/chats", headers={**headers, "X-Last-Write": str(written_at)})
+        assert [chat["chat_id"] for chat in response.json()] == [chat_id]
+    finally:
+        await replica_engine.dispose()
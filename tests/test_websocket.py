@@ -1,5 +1,4 @@
 import pytest
-import asyncio
 import websockets
 
 @pytest.mark.asyncio